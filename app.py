@@ -1,37 +1,79 @@
 # app.py
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
-from recommender import RecipeRecommender
-from nlp_utils import parse_message
-from dialogue import IDLE, AWAIT_SELECTION, CONFIRM, next_turn
+from flask import (
+    Flask, Response, render_template, request, jsonify, redirect, url_for, flash, stream_with_context, g
+)
+from reloader import CatalogReloader, CatalogNotReady
+from caching import SearchCache, ParseCache
+from dialogue import AWAIT_SELECTION, next_turn
+from sessions import SessionStore, SQLiteSessionStore, StaleSessionError
+from persistence import ChatWriter
+from hashing import HashPool, HashPoolBusy
+from metrics import route_latency, stage_latency, dialogue_transitions, prometheus_text, SampledProfiler
 
 from flask_login import (
     LoginManager, login_user, logout_user, login_required, current_user
 )
-from werkzeug.security import generate_password_hash, check_password_hash
 
 # tolerate models.py or model.py filename
 try:
-    from models import db, User, ChatSession, Message
+    from models import db, User, ChatSession, Message, ensure_indexes
 except ImportError:
-    from model import db, User, ChatSession, Message
+    from model import db, User, ChatSession, Message, ensure_indexes
 
+import json
+import os
 import uuid
 import re
+import tempfile
+import time
+from datetime import datetime
 
 app = Flask(__name__, static_folder="static", template_folder="templates")
 
 # ==============================
-# Core (unchanged)
+# Core: search index, caches, dialogue state
 # ==============================
-rec = RecipeRecommender(data_path="data/recipes.csv")
+# MIKA_RETRIEVAL=semantic|hybrid searches the LSA vectors stored in the
+# snapshot by `python semantic.py` (lexical TF-IDF without them)
+search_cache = SearchCache(None, maxsize=2048, ttl=600,   # pointed at the index once it is loaded
+                           mode=os.environ.get("MIKA_RETRIEVAL", "lexical"))
+
+# optional: fan each search out to MIKA_SEARCH_PROCESSES worker processes
+# over memory-mapped shards of the catalog (same results, for huge catalogs);
+# the workers fork here, before any background thread exists. Every app
+# worker shares the shard files under MIKA_SHARD_ROOT.
+shard_pool = None
+if int(os.environ.get("MIKA_SEARCH_PROCESSES", 0)):
+    from shards import ShardPool
+    shard_pool = ShardPool(processes=int(os.environ["MIKA_SEARCH_PROCESSES"]),
+                           root=os.environ.get("MIKA_SHARD_ROOT") or os.path.join(tempfile.gettempdir(), "mika-shards"))
+
+def on_catalog_change(new_rec):
+    search_cache.reset(new_rec)
+    if shard_pool is not None:
+        shard_pool.attach(new_rec, wait=False)
+
+# the catalog is re-read in the background when data/recipes.csv or its
+# snapshot changes (MIKA_RELOAD_INTERVAL seconds, 0 = never).
+# MIKA_CATALOG_WARM=background: the app serves at once and builds the index
+# on a thread; /readyz answers 503 and chat turns are refused until it is done
+catalog = CatalogReloader(
+    data_path="data/recipes.csv",
+    interval=float(os.environ.get("MIKA_RELOAD_INTERVAL", 10)),
+    on_change=on_catalog_change,
+    warm=os.environ.get("MIKA_CATALOG_WARM", "eager"),
+)
+parse_cache = ParseCache(maxsize=int(os.environ.get("MIKA_PARSE_CACHE_SIZE", 4096)))
 
-# session memory: sid -> {"state":..., "mem":...}
-SESSIONS = {}
+# session memory: sid -> Session(state, mem); idle/LRU sessions are evicted.
+# Set MIKA_SESSION_DB=/path/state.db to share it between workers.
+if os.environ.get("MIKA_SESSION_DB"):
+    SESSIONS = SQLiteSessionStore(os.environ["MIKA_SESSION_DB"], idle_ttl=6 * 3600)
+else:
+    SESSIONS = SessionStore(max_entries=20000, idle_ttl=6 * 3600)
 
 def ensure_session(sid):
-    if sid not in SESSIONS:
-        SESSIONS[sid] = {"state": IDLE, "mem": {}}
-    return SESSIONS[sid]
+    return SESSIONS.load(sid)
 
 # ==============================
 # Config: DB + Login
@@ -54,6 +96,92 @@ def load_user(uid):
 
 with app.app_context():
     db.create_all()
+    ensure_indexes()
+
+# MIKA_CHAT_WRITES=strict commits every turn before replying (tests, and
+# multi-worker deployments that need history pages to show the latest turn:
+# flush() below only waits for this worker's queue)
+chat_writer = ChatWriter(app, mode=os.environ.get("MIKA_CHAT_WRITES", "async"))
+
+# password / security-answer hashing runs on its own small pool; when it is
+# saturated the auth routes answer 503 instead of tying up more workers.
+# Each hash holds its request thread until done, so MIKA_HASH_WORKERS +
+# MIKA_HASH_QUEUE must stay well below the request threads per worker
+# (MIKA_WSGI_THREADS=16 under asgi.py, gunicorn --threads otherwise)
+hasher = HashPool(
+    workers=int(os.environ.get("MIKA_HASH_WORKERS", 2)),
+    max_queue=int(os.environ.get("MIKA_HASH_QUEUE", 2)),
+)
+
+# ==============================
+# Metrics: latency per route, sampled profiles
+# ==============================
+# write {"rate": 0.01, "dir": "..."} to this file to profile 1% of requests
+profiler = SampledProfiler(
+    os.environ.get("MIKA_PROFILE_CONTROL", "instance/profile.json"),
+    default_rate=float(os.environ.get("MIKA_PROFILE_RATE", 0)),
+    out_dir=os.environ.get("MIKA_PROFILE_DIR", "profiles"),
+)
+
+def route_name():
+    return f"{request.method} {request.url_rule.rule if request.url_rule else 'unmatched'}"
+
+@app.before_request
+def start_timer():
+    g.t0 = time.perf_counter()
+    g.prof = profiler.start()
+
+@app.teardown_request
+def record_latency(exc=None):
+    t0 = g.pop("t0", None)
+    if t0 is not None:
+        route_latency.observe(route_name(), 1000 * (time.perf_counter() - t0))
+    prof = g.pop("prof", None)
+    if prof is not None:
+        profiler.stop(prof, route_name())
+
+@app.get("/metrics/routes")
+def metrics_routes():
+    return jsonify({"routes": route_latency.stats(), "stages": stage_latency.stats(),
+                    "auth_hashing": hasher.stats()})
+
+@app.get("/healthz")
+def healthz():
+    return jsonify({"status": "ok"})
+
+@app.get("/readyz")
+def readyz():
+    """200 once the recipe index is loaded; 503 while it is being built."""
+    if not catalog.ready:
+        status = "failed" if catalog.error else "warming"
+        return jsonify({"status": status, "error": catalog.error}), 503, {"Retry-After": "2"}
+    return jsonify({"status": "ready", "recipes": len(catalog.current._store), "version": catalog.version})
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint (this worker's numbers)."""
+    extra = []
+    for cache_name, cache in (("search", search_cache), ("parse", parse_cache)):
+        stats = cache.stats()
+        extra += [
+            (f"mika_{cache_name}_cache_hits_total", "counter", f"{cache_name} cache hits.", stats["hits"]),
+            (f"mika_{cache_name}_cache_misses_total", "counter", f"{cache_name} cache misses.", stats["misses"]),
+            (f"mika_{cache_name}_cache_entries", "gauge", f"{cache_name} cache size.", stats["size"]),
+        ]
+    hashing = hasher.stats()
+    extra += [
+        ("mika_auth_hash_pending", "gauge", "Password hashes running or queued.", hashing["pending"]),
+        ("mika_auth_hash_rejected_total", "counter", "Auth requests refused with 503.", hashing["rejected"]),
+    ]
+    sessions = SESSIONS.stats()
+    extra += [
+        ("mika_sessions", "gauge", "Dialogue sessions held by the session store.", sessions["size"]),
+        ("mika_sessions_max", "gauge", "Session store capacity.", sessions["max_entries"]),
+        ("mika_sessions_evicted_idle_total", "counter", "Sessions dropped after the idle TTL.", sessions["evicted_idle"]),
+        ("mika_sessions_evicted_capacity_total", "counter", "Sessions dropped to stay within capacity.",
+         sessions["evicted_capacity"]),
+    ]
+    return Response(prometheus_text(extra), mimetype="text/plain; version=0.0.4")
 
 # ==============================
 # Security questions (for register/forgot)
@@ -76,67 +204,110 @@ def index():
     if current_user.is_authenticated:
         return redirect(url_for("dashboard"))
     # Guest dashboard (no server sessions)
+    # session state is created lazily by the first /chat turn
     sid = request.args.get("sid") or str(uuid.uuid4())
-    ensure_session(sid)
     return render_template("dashboard.html", sessions=[], sid=sid, guest=True)
 
 # ==============================
 # CHAT (same payload; DB only for logged-in)
 # ==============================
-@app.route("/chat", methods=["POST"])
-def chat():
-    data = request.get_json(force=True, silent=True) or {}
-    sid = data.get("sid")
-    msg = (data.get("message") or "").strip()
-    if not sid:
-        return jsonify({"reply":"Missing session id.","results":[]}), 400
+def run_turn(sid, msg):
+    """One dialogue turn for `sid`; returns (payload, http status)."""
+    with stage_latency.time("parse"):
+        parsed = parse_cache.parse(msg)
 
-    session = ensure_session(sid)
-    parsed = parse_message(msg)
-
-    def search_fn(p):  return rec.search(p, top_k=5)
-    def detail_fn(t):  return rec.details(t)
-
-    # Persist to DB ONLY for logged-in users
-    if current_user.is_authenticated:
-        # ensure session row
-        cs = ChatSession.query.filter_by(id=sid, user_id=current_user.id).first()
-        if cs is None:
-            # title will be set to first user msg (trimmed) if available
-            title = (re.sub(r"\s+", " ", msg).strip() or "New chat")[:40]
-            cs = ChatSession(id=sid, user_id=current_user.id, title=title)
-            db.session.add(cs)
-            db.session.commit()
-        else:
-            if not cs.title and msg:
-                cs.title = (re.sub(r"\s+", " ", msg).strip() or "New chat")[:40]
-                db.session.commit()
-        # save user message
-        if msg:
-            db.session.add(Message(session_id=sid, role="user", content=msg))
-            db.session.commit()
-
-    # dialogue core
-    new_state, new_mem, reply = next_turn(session["state"], session["mem"], parsed, search_fn, detail_fn)
-    session["state"] = new_state
-    session["mem"]   = new_mem
+    try:
+        rec = catalog.get()   # this request stays on one index even if a reload lands
+    except CatalogNotReady:
+        return {"reply": "Mika is still starting up, please try again in a moment.", "results": []}, 503
+    def search_fn(p):
+        with stage_latency.time("search"):
+            return search_cache.search(p, top_k=5, rec=rec)
+    def detail_fn(t):
+        with stage_latency.time("details"):
+            return rec.details(t)
+    def match_fn(n):
+        with stage_latency.time("match_title"):
+            return rec.match_title(n)
+
+    # dialogue core; re-run on a fresh copy if another request saved this sid meanwhile
+    for attempt in range(3):
+        with stage_latency.time("session_load"):
+            session = ensure_session(sid)
+        old_state = session.state
+        with stage_latency.time("next_turn"):
+            new_state, new_mem, reply = next_turn(session.state, session.mem, parsed, search_fn, detail_fn, match_fn)
+        session.state = new_state
+        session.mem   = new_mem
+        try:
+            with stage_latency.time("session_save"):
+                SESSIONS.save(sid, session)
+            break
+        except StaleSessionError:
+            if attempt == 2:
+                return {"reply":"Please try again.","results":[]}, 409
+    dialogue_transitions.inc(old_state, new_state)
 
     # results to render cards
     results = []
-    if new_state == AWAIT_SELECTION and "last_candidates" in session["mem"]:
-        results = session["mem"]["last_candidates"]
+    if new_state == AWAIT_SELECTION and "last_candidates" in session.mem:
+        results = session.mem["last_candidates"]
 
-    # persist bot reply for logged-in users
-    if current_user.is_authenticated and reply:
-        db.session.add(Message(session_id=sid, role="bot", content=reply))
-        db.session.commit()
+    # Persist to DB ONLY for logged-in users (session row + both messages, one transaction)
+    if current_user.is_authenticated:
+        with stage_latency.time("record_turn"):
+            chat_writer.record_turn(sid, current_user.id, msg, reply)
 
-    return jsonify({
+    return {
         "reply": reply,
         "results": results,
         "ui_suggestions": [],
-        "state": session["state"]  # "await_selection" / "confirm" / "idle" / "closed"
-    })
+        "state": session.state  # "await_selection" / "confirm" / "idle" / "closed"
+    }, 200
+
+@app.route("/chat", methods=["POST"])
+def chat():
+    data = request.get_json(force=True, silent=True) or {}
+    sid = data.get("sid")
+    msg = (data.get("message") or "").strip()
+    if not sid:
+        return jsonify({"reply":"Missing session id.","results":[]}), 400
+    payload, status = run_turn(sid, msg)
+    return jsonify(payload), status
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def reply_chunks(reply):
+    """Split a reply at paragraph breaks (keeps each markdown block whole)."""
+    parts = reply.split("\n\n")
+    return [p + "\n\n" for p in parts[:-1]] + [parts[-1]]
+
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """/chat as server-sent events: `cards`, then `reply` chunks, then `done`
+    (state); `error` replaces them when the turn fails. The first bytes go
+    out before the turn runs."""
+    data = request.get_json(force=True, silent=True) or {}
+    sid = data.get("sid")
+    msg = (data.get("message") or "").strip()
+    if not sid:
+        return jsonify({"reply":"Missing session id.","results":[]}), 400
+
+    def events():
+        yield ": turn started\n\n"
+        payload, status = run_turn(sid, msg)
+        if status != 200:
+            yield sse("error", dict(payload, status=status))
+            return
+        if payload["results"]:
+            yield sse("cards", {"results": payload["results"]})
+        for chunk in reply_chunks(payload["reply"]):
+            yield sse("reply", {"text": chunk})
+        yield sse("done", {"state": payload["state"], "ui_suggestions": payload["ui_suggestions"]})
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # ==============================
 # AUTH: Login / Register / Logout / Forgot
@@ -156,7 +327,7 @@ def login_post():
     if not u or not pw:
         return render_template("login.html", error="Enter username/email and password.")
     user = User.query.filter((User.email == u) | (User.username == u)).first()
-    if not user or not check_password_hash(user.password_hash, pw):
+    if not user or not hasher.check(user.password_hash, pw):
         return render_template("login.html", error="Invalid credentials.")
     login_user(user)
     return redirect(url_for("dashboard"))
@@ -198,15 +369,28 @@ def register_post():
         return render_template("register.html", questions=SECURITY_QUESTIONS,
             error="Password: 8–64 chars; letters, numbers, and @ # $ % ^ & + = ! . - _ allowed.")
 
+    pw_hash, answer_hash = hasher.generate(pw, a)
     user = User(
         first_name=fn, last_name=ln, username=un, email=em,
-        password_hash=generate_password_hash(pw),
-        sec_question=q, sec_answer_hash=generate_password_hash(a)
+        password_hash=pw_hash,
+        sec_question=q, sec_answer_hash=answer_hash
     )
     db.session.add(user); db.session.commit()
     flash("Account created successfully. Please log in.", "success")
     return redirect(url_for("login"))
 
+@app.errorhandler(HashPoolBusy)
+def auth_busy(_):
+    # back to the start of the flow that was being submitted
+    error = "Too many sign-in requests right now. Please try again in a moment."
+    if request.endpoint == "register_post":
+        page = render_template("register.html", questions=SECURITY_QUESTIONS, error=error)
+    elif request.endpoint == "login_post":
+        page = render_template("login.html", error=error)
+    else:
+        page = render_template("forgot.html", error=error)
+    return page, 503, {"Retry-After": "2"}
+
 @app.get("/forgot")
 def forgot():
     return render_template("forgot.html")
@@ -226,7 +410,7 @@ def forgot_verify():
     user = User.query.filter((User.email == u) | (User.username == u)).first()
     if not user:
         return render_template("forgot.html", error="Session expired. Start again.")
-    if not check_password_hash(user.sec_answer_hash, ans):
+    if not hasher.check(user.sec_answer_hash, ans):
         return render_template("forgot.html", step="question", question=user.sec_question, who=u, error="Incorrect answer. Try again.")
     return render_template("forgot.html", step="reset", who=u)
 
@@ -243,7 +427,7 @@ def forgot_reset():
     if not PASSWORD_RE.match(pw):
         return render_template("forgot.html", step="reset", who=u,
             error="Password: 8–64 chars; letters, numbers, and @ # $ % ^ & + = ! . - _ allowed.")
-    user.password_hash = generate_password_hash(pw)
+    user.password_hash = hasher.generate(pw)
     db.session.commit()
     return redirect(url_for("login"))
 
@@ -253,14 +437,34 @@ def forgot_reset():
 @app.get("/dashboard")
 @login_required
 def dashboard():
-    sessions = ChatSession.query.filter_by(user_id=current_user.id)\
-                                .order_by(ChatSession.created_at.desc()).all()
+    chat_writer.flush(user_id=current_user.id)
+    # keyset pagination on (created_at, id), newest first; ?cursor=<iso>~<id>
+    q = db.session.query(ChatSession.id, ChatSession.title, ChatSession.created_at)\
+                  .filter(ChatSession.user_id == current_user.id)
+    cursor = request.args.get("cursor") or ""
+    if "~" in cursor:
+        at, last_id = cursor.split("~", 1)
+        try:
+            at = datetime.fromisoformat(at)
+        except ValueError:
+            return redirect(url_for("dashboard"))
+        q = q.filter((ChatSession.created_at < at) |
+                     ((ChatSession.created_at == at) & (ChatSession.id < last_id)))
+    rows = q.order_by(ChatSession.created_at.desc(), ChatSession.id.desc())\
+            .limit(SESSIONS_PAGE + 1).all()
+    sessions = rows[:SESSIONS_PAGE]
+    next_cursor = None
+    if len(rows) > SESSIONS_PAGE:
+        last = sessions[-1]
+        next_cursor = f"{last.created_at.isoformat()}~{last.id}"
     sid = uuid.uuid4().hex  # fresh chat sid
-    return render_template("dashboard.html", sessions=sessions, sid=sid)
+    return render_template("dashboard.html", sessions=sessions, sid=sid, next_cursor=next_cursor)
 
 # ==============================
 # Session APIs (used by sidebar)
 # ==============================
+SESSIONS_PAGE = 50    # sidebar chats per dashboard page
+MESSAGES_PAGE = 100   # messages per history page
 
 @app.post("/api/sessions")
 def api_create_session():
@@ -283,21 +487,32 @@ def api_create_session():
 
 @app.get("/api/sessions/<sid>/messages")
 def api_get_messages(sid):
-    """Return messages for a session (DB for auth; empty for guest)."""
+    """Return messages for a session (DB for auth; empty for guest).
+       Newest page first: ?limit=N (≤ 500) and ?before=<id> for older pages;
+       messages are oldest→newest, `next_before` is null on the first message.
+    """
     if not current_user.is_authenticated:
-        return jsonify({"ok": True, "messages": []})
-    sess = ChatSession.query.filter_by(id=sid, user_id=current_user.id).first()
-    if not sess:
+        return jsonify({"ok": True, "messages": [], "next_before": None})
+    chat_writer.flush(sid=sid)
+    owned = db.session.query(ChatSession.id).filter_by(id=sid, user_id=current_user.id).first()
+    if not owned:
         return jsonify({"ok": False, "error": "Not found"}), 404
-    msgs = Message.query.filter_by(session_id=sid).order_by(Message.id.asc()).all()
+
+    limit = min(max(request.args.get("limit", MESSAGES_PAGE, type=int), 1), 500)
+    q = db.session.query(Message.id, Message.role, Message.content, Message.created_at)\
+                  .filter(Message.session_id == sid)
+    before = request.args.get("before", type=int)
+    if before is not None:
+        q = q.filter(Message.id < before)
+    rows = q.order_by(Message.id.desc()).limit(limit + 1).all()
+    page = rows[:limit][::-1]
     return jsonify({"ok": True, "messages": [
-        {"role": m.role, "content": m.content, "created_at": m.created_at.isoformat()} for m in msgs
-    ]})
+        {"id": m.id, "role": m.role, "content": m.content, "created_at": m.created_at.isoformat()} for m in page
+    ], "next_before": page[0].id if len(rows) > limit else None})
 
 # ==============================
 # Main
 # ==============================
 if __name__ == "__main__":
-    import os
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=False)
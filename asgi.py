@@ -0,0 +1,193 @@
+# asgi.py — async serving mode for the chat app
+#
+#   uvicorn asgi:app --workers 4
+#
+# POST /chat and /chat/stream are served on the event loop: the request
+# body is read and the response written asynchronously, and the dialogue
+# turn (parse, search, session save) runs on a bounded thread pool, so a
+# slow client or a long stream never holds a thread. Chat turns are
+# persisted by persistence.ChatWriter's background thread (the default
+# MIKA_CHAT_WRITES=async), so the loop never waits on a DB commit. With
+# MIKA_SEARCH_PROCESSES set, searches inside a turn fan out to the shard
+# worker processes. Every other route is the unchanged Flask app, run on
+# a second thread pool.
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app as flask_app, run_turn, reply_chunks, sse, profiler
+from metrics import route_latency
+
+TURN_THREADS = int(os.environ.get("MIKA_TURN_THREADS", 8))
+WSGI_THREADS = int(os.environ.get("MIKA_WSGI_THREADS", 16))
+# turns allowed to wait for a thread; beyond this /chat answers 503 at once
+MAX_PENDING_TURNS = int(os.environ.get("MIKA_MAX_PENDING_TURNS", 256))
+MAX_BODY = 1 << 20
+
+turn_pool = ThreadPoolExecutor(TURN_THREADS, thread_name_prefix="chat-turn")
+wsgi_pool = ThreadPoolExecutor(WSGI_THREADS, thread_name_prefix="wsgi")
+_pending = 0
+
+
+# ---------- helpers ----------
+async def read_body(receive):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunks.append(message.get("body", b""))
+        size += len(chunks[-1])
+        if size > MAX_BODY:
+            return None
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def build_environ(scope, body):
+    """WSGI environ for an ASGI http scope and its (already read) body."""
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope["query_string"].decode("ascii"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin1").upper().replace("-", "_")
+        value = value.decode("latin1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+async def send_json(send, payload, status=200):
+    body = flask_app.json.dumps(payload).encode("utf-8") + b"\n"
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+def _turn(environ, sid, msg):
+    # a request context so flask-login resolves the user from the cookies
+    prof = profiler.start()   # Flask's before/teardown hooks do not run here
+    try:
+        with flask_app.request_context(environ):
+            return run_turn(sid, msg)
+    finally:
+        if prof is not None:
+            profiler.stop(prof, f"POST {environ['PATH_INFO']}")
+
+
+def _call_wsgi(environ):
+    """Run the Flask app for one request; returns (status, headers, body)."""
+    started = {}
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = [(k.lower().encode("latin1"), v.encode("latin1")) for k, v in headers]
+    result = flask_app(environ, start_response)
+    try:
+        body = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return started["status"], started["headers"], body
+
+
+# ---------- routes ----------
+async def chat(scope, receive, send, stream):
+    global _pending
+    raw = await read_body(receive)
+    if raw is None:
+        return await send_json(send, {"reply": "Request too large.", "results": []}, 413)
+    try:
+        data = json.loads(raw or b"{}")
+    except ValueError:
+        data = {}
+    data = data if isinstance(data, dict) else {}
+    sid = data.get("sid")
+    msg = (data.get("message") or "").strip()
+    if not sid:
+        return await send_json(send, {"reply": "Missing session id.", "results": []}, 400)
+    if _pending >= MAX_PENDING_TURNS:
+        return await send_json(send, {"reply": "Mika is busy, please try again.", "results": []}, 503)
+
+    if stream:
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream; charset=utf-8"),
+                                (b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no")]})
+        await send({"type": "http.response.body", "body": b": turn started\n\n", "more_body": True})
+
+    environ = build_environ(scope, raw)
+    _pending += 1
+    try:
+        payload, status = await asyncio.get_running_loop().run_in_executor(turn_pool, _turn, environ, sid, msg)
+    finally:
+        _pending -= 1
+
+    if not stream:
+        return await send_json(send, payload, status)
+    if status != 200:
+        events = [sse("error", dict(payload, status=status))]
+    else:
+        events = [sse("cards", {"results": payload["results"]})] if payload["results"] else []
+        events += [sse("reply", {"text": chunk}) for chunk in reply_chunks(payload["reply"])]
+        events.append(sse("done", {"state": payload["state"], "ui_suggestions": payload["ui_suggestions"]}))
+    for event in events:
+        await send({"type": "http.response.body", "body": event.encode("utf-8"), "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def wsgi(scope, receive, send):
+    raw = await read_body(receive)
+    if raw is None:
+        await send({"type": "http.response.start", "status": 413, "headers": []})
+        return await send({"type": "http.response.body", "body": b""})
+    environ = build_environ(scope, raw)
+    status, headers, body = await asyncio.get_running_loop().run_in_executor(wsgi_pool, _call_wsgi, environ)
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            turn_pool.shutdown(wait=True)
+            wsgi_pool.shutdown(wait=True)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    if scope["method"] == "POST" and scope["path"] in ("/chat", "/chat/stream"):
+        # served outside Flask, so its before/teardown timing hooks never run
+        t0 = time.perf_counter()
+        try:
+            return await chat(scope, receive, send, stream=scope["path"] == "/chat/stream")
+        finally:
+            route_latency.observe(f"POST {scope['path']}", 1000 * (time.perf_counter() - t0))
+    return await wsgi(scope, receive, send)
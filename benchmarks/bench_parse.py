@@ -0,0 +1,51 @@
+# benchmarks/bench_parse.py — parse_message golden-file check and throughput
+#
+#   python -m benchmarks.bench_parse
+#
+# parse_golden.jsonl holds messages with the output of the original
+# multi-pass parser (messages naming two cuisines are left out: that parser
+# picked one in set-iteration order). Exits non-zero on any mismatch.
+import json
+import os
+import sys
+import time
+
+from nlp_utils import parse_message, _parse_message_regex
+
+GOLDEN = os.path.join(os.path.dirname(__file__), "parse_golden.jsonl")
+
+
+def check(golden):
+    bad = 0
+    for g in golden:
+        for fn in (parse_message, _parse_message_regex):
+            if fn(g["message"]) != g["parsed"]:
+                bad += 1
+                print(f"MISMATCH {fn.__name__}: {g['message']!r}")
+    return bad
+
+
+def throughput(fn, messages, seconds=1.0):
+    n, t0 = 0, time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        for m in messages:
+            fn(m)
+        n += len(messages)
+    return n / (time.perf_counter() - t0)
+
+
+def main():
+    with open(GOLDEN, encoding="utf-8") as f:
+        golden = [json.loads(line) for line in f]
+    bad = check(golden)
+    print(f"golden: {len(golden)} messages, {bad} mismatches")
+    messages = [g["message"] for g in golden]
+    old = throughput(_parse_message_regex, messages)
+    new = throughput(parse_message, messages)
+    print(f"multi-pass regex: {old:>10,.0f} msg/s")
+    print(f"single-pass:      {new:>10,.0f} msg/s  ({new / old:.1f}x)")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+# benchmarks/bench_pipeline.py — chat hot-path micro-benchmarks vs catalog size
+#
+#   python -m benchmarks.bench_pipeline [sizes...] > pipeline.json
+#
+# Times parse_message, RecipeRecommender.search / details and
+# dialogue.next_turn (a search turn and a selection turn) on synthetic
+# catalogs (default 1k, 100k and 1M rows) and prints one JSON document.
+# Fitted indexes are kept as snapshots next to the cached catalogs, so
+# only the first run at each size pays for the fit.
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.synth import catalog, queries
+from dialogue import IDLE, AWAIT_SELECTION, next_turn
+from nlp_utils import parse_message
+from recommender import RecipeRecommender, SNAPSHOT_FORMAT
+
+
+def latency(fn, items, min_runs=200):
+    """p50/p95/p99 (ms) and calls per second of fn over `items`, cycled."""
+    runs = (items * (min_runs // len(items) + 1))[:max(min_runs, len(items))]
+    lat = np.empty(len(runs))
+    for i, item in enumerate(runs):
+        t0 = time.perf_counter()
+        fn(item)
+        lat[i] = time.perf_counter() - t0
+    ms = 1000 * lat
+    return {
+        "runs": len(runs),
+        "ops_per_s": round(len(runs) / float(lat.sum()), 1),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+    }
+
+
+def bench(n, messages):
+    path = catalog(n)
+    t0 = time.perf_counter()
+    rec = RecipeRecommender(path)
+    try:
+        with open(os.path.join(rec.index_path, "meta.json")) as f:
+            saved = json.load(f).get("format") == SNAPSHOT_FORMAT
+    except (OSError, ValueError):
+        saved = False
+    if not saved:
+        rec.save_snapshot()
+    load_s = time.perf_counter() - t0
+
+    parsed = [parse_message(m) for m in messages]
+    hits = [p for p in parsed if rec.search(p)[0]]
+    titles = [r["title"] for p in hits[:50] for r in rec.search(p)[0]]
+
+    def search_turn(p):
+        return next_turn(IDLE, {}, p, rec.search, rec.details, rec.match_title)
+
+    # selection turns start from the memory a search turn left behind
+    shown = [search_turn(p)[1] for p in hits[:50]]
+    pick = parse_message("2")
+    def select_turn(mem):
+        return next_turn(AWAIT_SELECTION, dict(mem), pick, rec.search, rec.details, rec.match_title)
+
+    return {
+        "rows": n,
+        "load_s": round(load_s, 2),
+        "parse_message": latency(parse_message, messages, min_runs=2000),
+        "search": latency(rec.search, parsed),
+        "details": latency(rec.details, titles, min_runs=2000),
+        "next_turn.search": latency(search_turn, hits),
+        "next_turn.select": latency(select_turn, shown, min_runs=2000),
+    }
+
+
+def main(sizes):
+    messages = queries(200)
+    out = {"cpus": os.cpu_count(), "results": []}
+    for n in sizes:
+        out["results"].append(bench(n, messages))
+        print(f"{n} rows done", file=sys.stderr)
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1000, 100000, 1000000])
@@ -0,0 +1,71 @@
+# benchmarks/bench_search.py — RecipeRecommender.search latency vs catalog size
+#
+#   python -m benchmarks.bench_search [sizes...]
+#
+# "full scan" re-runs the previous implementation (dense cosine over every
+# row, pandas masks, full argsort, df.iloc rows) on the same fitted index,
+# with the catalog rebuilt as a DataFrame (the recommender keeps none).
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics.pairwise import cosine_similarity
+
+from benchmarks.synth import catalog, queries
+from nlp_utils import parse_message
+from recommender import RecipeRecommender, _norm_diet
+
+
+def catalog_frame(rec):
+    df = rec._store.to_frame()
+    df["diet_norm"] = df["diet"].map(_norm_diet)
+    return df
+
+
+def full_scan_search(rec, df, parsed, top_k=5):
+    q_vec = rec.vectorizer.transform([rec._query_text(parsed)])
+    sim = cosine_similarity(q_vec, rec.tfidf).ravel()
+    inc = set(parsed.get("ingredients") or [])
+    ing_col = df["ingredients"].fillna("").str.lower()
+    if inc:
+        boost = ing_col.apply(lambda x: sum(1 for t in inc if t in x)).astype(float).values.copy()
+        if boost.max() > 0:
+            sim = 0.85 * sim + 0.15 * boost / boost.max()
+    mask = pd.Series(True, index=df.index)
+    if parsed.get("diet"):
+        mask &= df["diet_norm"] == parsed["diet"]
+    if parsed.get("time_limit"):
+        mask &= pd.to_numeric(df["time"], errors="coerce") <= parsed["time_limit"]
+    excludes = set(parsed.get("exclude") or [])
+    if excludes:
+        mask &= ~ing_col.apply(lambda x: any(e in x for e in excludes))
+    if parsed.get("cuisine"):
+        mask &= df["cuisine"].fillna("").str.lower().str.contains(rf"\b{parsed['cuisine']}\b")
+    masked = np.where(mask.values, sim, -1.0)
+    idx = [i for i in np.argsort(masked)[::-1][:top_k] if masked[i] > 0]
+    return [df.iloc[i]["title"] for i in idx]
+
+
+def timeit(fn, items, min_runs=20):
+    lat = []
+    for p in (items * (min_runs // len(items) + 1))[:max(min_runs, len(items))]:
+        t0 = time.perf_counter()
+        fn(p)
+        lat.append(time.perf_counter() - t0)
+    return 1000 * float(np.median(lat)), 1000 * float(np.percentile(lat, 95))
+
+
+def main(sizes):
+    parsed = [parse_message(m) for m in queries(50)]
+    print(f"{'rows':>9} {'full scan p50/p95 ms':>22} {'indexed p50/p95 ms':>20} {'speedup':>8}")
+    for n in sizes:
+        rec = RecipeRecommender(catalog(n), use_snapshot=False)
+        df = catalog_frame(rec)
+        old = timeit(lambda p: full_scan_search(rec, df, p), parsed[:10])
+        new = timeit(lambda p: rec.search(p), parsed, min_runs=200)
+        print(f"{n:>9} {old[0]:>10.2f} / {old[1]:<9.2f} {new[0]:>8.2f} / {new[1]:<9.2f} {old[0] / new[0]:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1000, 10000, 100000])
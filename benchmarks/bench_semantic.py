@@ -0,0 +1,60 @@
+# benchmarks/bench_semantic.py — lexical vs semantic vs hybrid search by catalog size
+#
+#   python -m benchmarks.bench_semantic [sizes...]
+#
+# Per size: time to build the LSA vectors and IVF lists, p50/p95 latency of
+# each search mode, and the IVF's recall@10 against an exact scan of every
+# row's LSA cosine under the same filters.
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.bench_search import timeit
+from benchmarks.synth import catalog, queries
+from nlp_utils import parse_message
+from recommender import RecipeRecommender, _top_k
+
+
+def exact_semantic(rec, parsed, k):
+    sem = rec._semantic
+    q = sem.project(rec.vectorizer.transform([rec._query_text(parsed)]))
+    if q is None:
+        return None
+    rows = np.arange(len(sem))
+    rows = rows[rec._apply_filters(rows, parsed)]
+    score = sem.similarity(rows, q)
+    keep = score > 0
+    return _top_k(rows[keep], score[keep], k)
+
+
+def recall(rec, parsed_list, k=10):
+    hits = total = 0
+    for parsed in parsed_list:
+        exact = exact_semantic(rec, parsed, k)
+        if exact is None or not len(exact):
+            continue
+        q_vec = rec.vectorizer.transform([rec._query_text(parsed)])
+        found = rec._semantic_top_k(parsed, q_vec, k, hybrid=False)
+        hits += len(np.intersect1d(exact, found))
+        total += len(exact)
+    return hits / total if total else float("nan")
+
+
+def main(sizes):
+    parsed = [parse_message(m) for m in queries(100)]
+    print(f"{'rows':>9} {'build s':>8} {'lexical p50/p95 ms':>19} {'semantic p50/p95 ms':>20} "
+          f"{'hybrid p50/p95 ms':>18} {'recall@10':>10}")
+    for n in sizes:
+        rec = RecipeRecommender(catalog(n), use_snapshot=False)
+        t0 = time.perf_counter()
+        rec.build_semantic()
+        build = time.perf_counter() - t0
+        lat = [timeit(lambda p: rec.search(p, mode=mode), parsed, min_runs=200)
+               for mode in ("lexical", "semantic", "hybrid")]
+        cols = " ".join(f"{p50:>9.2f} / {p95:<8.2f}" for p50, p95 in lat)
+        print(f"{n:>9} {build:>8.1f} {cols} {recall(rec, parsed):>10.3f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1000, 10000, 100000])
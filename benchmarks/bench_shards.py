@@ -0,0 +1,39 @@
+# benchmarks/bench_shards.py — sharded search latency vs worker processes
+#
+#   python -m benchmarks.bench_shards [rows] [processes...]
+#
+# Every run checks that the sharded results equal the in-process ones.
+import os
+import sys
+
+from benchmarks.bench_search import timeit
+from benchmarks.synth import catalog, queries
+from nlp_utils import parse_message
+from recommender import RecipeRecommender
+from shards import ShardPool
+
+
+def main(n, process_counts):
+    parsed = [parse_message(m) for m in queries(100)]
+    rec = RecipeRecommender(catalog(n), use_snapshot=False)
+    expected = [rec.search(p) for p in parsed]
+    base = timeit(lambda p: rec.search(p), parsed, min_runs=100)
+    print(f"{n} rows, {os.cpu_count()} cores")
+    print(f"{'processes':>9} {'p50/p95 ms':>18} {'speedup':>8}")
+    print(f"{'in-proc':>9} {base[0]:>8.2f} / {base[1]:<7.2f} {1.0:>7.1f}x")
+    for k in process_counts:
+        pool = ShardPool(processes=k)
+        pool.attach(rec)
+        if [rec.search(p) for p in parsed] != expected:
+            raise SystemExit(f"sharded results differ with {k} processes")
+        lat = timeit(lambda p: rec.search(p), parsed, min_runs=100)
+        print(f"{k:>9} {lat[0]:>8.2f} / {lat[1]:<7.2f} {base[0] / lat[0]:>7.1f}x")
+        rec._shards = None
+        pool.close()
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    cores = os.cpu_count() or 1
+    counts = [int(a) for a in sys.argv[2:]] or sorted({c for c in (1, 2, 4, 8, 16, 32) if c <= cores} | {cores})
+    main(n, counts)
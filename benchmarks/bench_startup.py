@@ -0,0 +1,65 @@
+# benchmarks/bench_startup.py — app import time and first-request latency
+#
+#   python -m benchmarks.bench_startup [runs]
+#
+# Starts a fresh interpreter per run, once with MIKA_CATALOG_WARM=eager
+# (index built during import) and once with =background (built on a
+# thread after import), and reports the medians as JSON: process start to
+# `import app` done, the first GET /login, and the first /chat turn that
+# succeeds (background mode polls until the index is ready).
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+def child():
+    t0 = time.perf_counter()
+    import app
+    imported = time.perf_counter()
+    client = app.app.test_client()
+    client.get("/login")
+    login = time.perf_counter()
+    ready_at_import = client.get("/readyz").status_code == 200
+    while True:
+        t = time.perf_counter()
+        r = client.post("/chat", json={"sid": "startup", "message": "paneer tomato"})
+        if r.status_code == 200:
+            break
+        time.sleep(0.01)
+    done = time.perf_counter()
+    print(json.dumps({
+        "import_s": imported - t0,
+        "first_login_ms": 1000 * (login - imported),
+        "ready_at_first_request": ready_at_import,
+        "first_chat_ms": 1000 * (done - t),
+        "chat_ready_s": done - t0,
+    }))
+
+
+def run(mode):
+    env = dict(os.environ, MIKA_CATALOG_WARM=mode, MIKA_RELOAD_INTERVAL="0")
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", "--child"],
+                         env=env, capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["process_s"] = time.perf_counter() - t0
+    return result
+
+
+def main(runs):
+    out = {}
+    for mode in ("eager", "background"):
+        results = [run(mode) for _ in range(runs)]
+        out[mode] = {k: round(statistics.median(r[k] for r in results), 3) if k != "ready_at_first_request"
+                     else all(r[k] for r in results) for k in results[0]}
+    print(json.dumps({"runs": runs, **out}, indent=2))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--child"]:
+        child()
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
@@ -0,0 +1,86 @@
+# benchmarks/load_chat.py — concurrent /chat load against a running server
+#
+#   gunicorn -w 4 -b 127.0.0.1:8001 app:app                               # sync
+#   uvicorn asgi:app --workers 4 --port 8002 --log-level warning          # async
+#   python -m benchmarks.load_chat http://127.0.0.1:8001 [concurrency] [seconds]
+#   python -m benchmarks.load_chat http://127.0.0.1:8002 [concurrency] [seconds]
+#
+# Each client loops: new session id, one search message, one selection.
+# Clients read responses at `MIKA_LOAD_CLIENT_KBPS` (default: unthrottled)
+# to imitate slow mobile links, which is where a sync worker sits idle.
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from benchmarks.synth import queries
+
+KBPS = float(os.environ.get("MIKA_LOAD_CLIENT_KBPS", 0))
+
+
+async def post(host, port, path, payload):
+    body = json.dumps(payload).encode()
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = None
+    while True:
+        chunk = await reader.read(4096 if KBPS else 65536)
+        if not chunk:
+            break
+        if status is None:
+            status = int(chunk.split(b" ", 2)[1])
+        if KBPS:
+            await asyncio.sleep(len(chunk) / (KBPS * 1024))
+    writer.close()
+    return status
+
+
+async def client(host, port, msgs, deadline, lat, errors):
+    i = 0
+    while time.perf_counter() < deadline:
+        sid = uuid.uuid4().hex
+        for msg in (msgs[i % len(msgs)], "1"):
+            t0 = time.perf_counter()
+            try:
+                status = await post(host, port, "/chat", {"sid": sid, "message": msg})
+            except OSError:
+                status = None
+            if status == 200:
+                lat.append(time.perf_counter() - t0)
+            else:
+                errors.append(status)
+        i += 1
+
+
+async def run(url, concurrency, seconds):
+    u = urlsplit(url)
+    msgs = queries(200)
+    lat, errors = [], []
+    t0 = time.perf_counter()
+    deadline = t0 + seconds
+    await asyncio.gather(*(client(u.hostname, u.port or 80, msgs[k::concurrency] or msgs, deadline, lat, errors)
+                           for k in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    ms = 1000 * np.array(lat) if lat else np.zeros(1)
+    return {
+        "url": url, "concurrency": concurrency, "seconds": round(elapsed, 2),
+        "requests": len(lat), "errors": len(errors), "rps": round(len(lat) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+    }
+
+
+if __name__ == "__main__":
+    url = sys.argv[1] if len(sys.argv) > 1 else "http://127.0.0.1:5000"
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 20
+    print(json.dumps(asyncio.run(run(url, concurrency, seconds))))
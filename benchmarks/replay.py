@@ -0,0 +1,129 @@
+# benchmarks/replay.py — replay multi-turn conversations against the chat app
+#
+#   python -m benchmarks.replay app [concurrency] [seconds]        # Flask test client, in-process
+#   python -m benchmarks.replay http://127.0.0.1:8002 [concurrency] [seconds]
+#
+# Each client replays scripted chats (benchmarks.synth.conversations, or
+# one JSON list of messages per line from MIKA_REPLAY_FILE), one new
+# session per chat, turn after turn. MIKA_REPLAY_PATH=/chat/stream replays
+# against the streaming endpoint. Prints one JSON document: throughput and
+# p50/p95/p99 overall and per kind of turn (search, select, confirm, ...).
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from benchmarks.load_chat import post
+from benchmarks.synth import conversations
+
+PATH = os.environ.get("MIKA_REPLAY_PATH", "/chat")
+
+
+def load_conversations():
+    path = os.environ.get("MIKA_REPLAY_FILE")
+    if not path:
+        return conversations(500)
+    with open(path, encoding="utf-8") as f:
+        return [[("turn", m) for m in json.loads(line)] for line in f if line.strip()]
+
+
+def summary(lat_ms):
+    ms = np.array(lat_ms) if lat_ms else np.zeros(1)
+    return {
+        "turns": len(lat_ms),
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+    }
+
+
+def report(target, concurrency, elapsed, chats, lat, errors):
+    """`lat`: (kind, ms) of every successful turn."""
+    kinds = sorted({k for k, _ in lat})
+    return {
+        "target": target, "path": PATH, "concurrency": concurrency, "seconds": round(elapsed, 2),
+        "conversations": chats, "errors": len(errors),
+        "turns_per_s": round(len(lat) / elapsed, 1),
+        "conversations_per_s": round(chats / elapsed, 1),
+        **summary([ms for _, ms in lat]),
+        "by_kind": {k: summary([ms for kk, ms in lat if kk == k]) for k in kinds},
+    }
+
+
+# ---------- in-process (Flask test client) ----------
+def run_app(concurrency, seconds):
+    from app import app
+    convs = load_conversations()
+    lat, errors, chats = [], [], [0]
+    lock = threading.Lock()
+    t0 = time.perf_counter()
+    deadline = t0 + seconds
+
+    def client(k):
+        c = app.test_client()
+        i = k
+        while time.perf_counter() < deadline:
+            sid = uuid.uuid4().hex
+            for kind, msg in convs[i % len(convs)]:
+                t = time.perf_counter()
+                r = c.post(PATH, json={"sid": sid, "message": msg})
+                r.get_data()
+                ms = 1000 * (time.perf_counter() - t)
+                with lock:
+                    (lat.append((kind, ms)) if r.status_code == 200 else errors.append(r.status_code))
+            with lock:
+                chats[0] += 1
+            i += concurrency
+
+    threads = [threading.Thread(target=client, args=(k,)) for k in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return report("app", concurrency, time.perf_counter() - t0, chats[0], lat, errors)
+
+
+# ---------- over HTTP ----------
+async def run_url(url, concurrency, seconds):
+    u = urlsplit(url)
+    convs = load_conversations()
+    lat, errors, chats = [], [], [0]
+    t0 = time.perf_counter()
+    deadline = t0 + seconds
+
+    async def client(k):
+        i = k
+        while time.perf_counter() < deadline:
+            sid = uuid.uuid4().hex
+            for kind, msg in convs[i % len(convs)]:
+                t = time.perf_counter()
+                try:
+                    status = await post(u.hostname, u.port or 80, PATH, {"sid": sid, "message": msg})
+                except OSError:
+                    status = None
+                if status == 200:
+                    lat.append((kind, 1000 * (time.perf_counter() - t)))
+                else:
+                    errors.append(status)
+            chats[0] += 1
+            i += concurrency
+
+    await asyncio.gather(*(client(k) for k in range(concurrency)))
+    return report(url, concurrency, time.perf_counter() - t0, chats[0], lat, errors)
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else "app"
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 20
+    if target == "app":
+        result = run_app(concurrency, seconds)
+    else:
+        result = asyncio.run(run_url(target, concurrency, seconds))
+    print(json.dumps(result))
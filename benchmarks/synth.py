@@ -0,0 +1,74 @@
+# benchmarks/synth.py — synthetic recipe catalogs for benchmarks
+import csv
+import os
+import random
+import tempfile
+
+from nlp_utils import CUISINES
+
+INGREDIENTS = [
+    "paneer", "tomato", "onion", "garlic", "ginger", "chili", "spinach", "potato", "rice", "egg",
+    "chicken", "fish", "prawn", "mutton", "tofu", "mushroom", "cream", "butter", "cheese", "yogurt",
+    "lentil", "chickpea", "beans", "corn", "peas", "carrot", "cabbage", "cauliflower", "eggplant", "zucchini",
+    "pasta", "noodles", "bread", "coconut", "lemon", "lime", "basil", "cilantro", "mint", "cumin",
+    "turmeric", "paprika", "soy sauce", "sesame", "miso", "kimchi", "avocado", "olive oil", "bell pepper", "pumpkin",
+]
+DISHES = ["curry", "stir fry", "salad", "soup", "bowl", "masala", "pasta", "wrap", "bake", "fritters", "stew", "tacos"]
+VERBS = ["saute", "simmer", "boil", "roast", "grill", "toss", "blend", "fry", "steam", "bake"]
+DIETS = ["veg", "non-veg", "vegan"]
+
+
+def write_catalog(n, path, seed=0):
+    """Write an n-row recipes.csv with the same columns as data/recipes.csv."""
+    rnd = random.Random(seed)
+    cuisines = sorted(CUISINES)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["title", "ingredients", "steps", "time", "cuisine", "diet"])
+        for i in range(n):
+            ings = rnd.sample(INGREDIENTS, rnd.randint(3, 8))
+            title = f"{ings[0].title()} {rnd.choice(DISHES).title()} {i}"
+            steps = "; ".join(f"{rnd.choice(VERBS)} {ing}" for ing in ings[:4]) + "."
+            w.writerow([title, ", ".join(ings), steps, rnd.randrange(5, 90), rnd.choice(cuisines), rnd.choice(DIETS)])
+    return path
+
+
+def catalog(n, seed=0):
+    """Path to a cached synthetic catalog of n rows (generated on first use)."""
+    d = os.path.join(tempfile.gettempdir(), "recipe-bot-bench")
+    os.makedirs(d, exist_ok=True)
+    path = os.path.join(d, f"recipes_{n}_{seed}.csv")
+    if not os.path.exists(path):
+        write_catalog(n, path, seed)
+    return path
+
+
+def queries(k, seed=1):
+    """k chat messages in the style users type them."""
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(k):
+        msg = " ".join(rnd.sample(INGREDIENTS, rnd.randint(1, 3)))
+        if rnd.random() < 0.3: msg += " " + rnd.choice(DIETS)
+        if rnd.random() < 0.2: msg += " " + rnd.choice(sorted(CUISINES))
+        if rnd.random() < 0.3: msg += f" under {rnd.choice([15, 20, 30, 45])} min"
+        if rnd.random() < 0.2: msg += " without " + rnd.choice(["onion", "garlic", "egg", "cream"])
+        out.append(msg)
+    return out
+
+
+def conversations(k, seed=2):
+    """k scripted chats as lists of (kind, message): a search, then the
+    usual follow-ups (pick by number or name, yes/no, refine, greet)."""
+    rnd = random.Random(seed)
+    msgs = queries(k, seed=seed)
+    out = []
+    for msg in msgs:
+        turns = [("greet", "hi")] if rnd.random() < 0.3 else []
+        turns.append(("search", msg))
+        if rnd.random() < 0.3:
+            turns.append(("refine", msg + " " + rnd.choice(["quick", "veg", "under 20 min"])))
+        turns.append(("select", str(rnd.randint(1, 5)) if rnd.random() < 0.8 else msg.split()[0]))
+        turns.append(("confirm", rnd.choice(["yes", "yes", "no"])))
+        out.append(turns)
+    return out
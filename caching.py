@@ -0,0 +1,145 @@
+# caching.py — small in-process caches for the chat hot path
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+
+from dialogue import query_key
+from nlp_utils import parse_message
+
+
+class LRUCache:
+    """Thread-safe LRU with an optional per-entry TTL (seconds) and hit/miss counters."""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires, value = item
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+
+def _deduped(parsed):
+    """`parsed` with repeated ingredients/excludes dropped, first occurrences in order."""
+    return dict(parsed, ingredients=list(dict.fromkeys(parsed.get("ingredients") or [])),
+                exclude=list(dict.fromkeys(parsed.get("exclude") or [])))
+
+
+class SearchCache:
+    """Result cache in front of RecipeRecommender.search.
+
+    Keyed on dialogue.query_key, so queries that differ only in word order
+    or repeated ingredients share an entry. A miss searches the query with
+    repeats dropped but its word order kept: the TF-IDF query has bigrams,
+    so "tomato garam" and "garam tomato" can rank differently, and an
+    entry holds the ranking of the order that missed first. `mode` is
+    passed through to rec.search (lexical, semantic or hybrid retrieval).
+    """
+
+    def __init__(self, rec, maxsize=1024, ttl=300, mode=None):
+        self.rec = rec
+        self.mode = mode
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._generation = 0
+
+    def search(self, parsed, top_k=5, rec=None):
+        """`rec` is the index the caller is pinned to; if the catalog has been
+        swapped since, the search goes straight to it and skips the cache."""
+        key = (query_key(parsed), top_k)
+        generation = self._generation   # read before self.rec; reset() writes them in reverse
+        current = self.rec
+        if rec is not None and rec is not current:
+            return rec.search(_deduped(parsed), top_k=top_k, mode=self.mode)
+        hit = self._cache.get(key)
+        if hit is None:
+            hit = current.search(_deduped(parsed), top_k=top_k, mode=self.mode)
+            # a reset() during the search means `hit` may predate the change
+            if self._generation == generation:
+                self._cache.put(key, hit)
+        results, rationale = hit
+        # callers keep these in session memory; never hand out the cached dicts
+        return [dict(r) for r in results], rationale
+
+    def reset(self, rec=None):
+        """Drop every entry, e.g. after the catalog was reloaded into `rec` or updated."""
+        if rec is not None:
+            self.rec = rec
+        self._generation += 1
+        self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+def freeze_parsed(parsed):
+    """Read-only view of a parse_message() dict (lists become tuples)."""
+    return MappingProxyType({k: tuple(v) if isinstance(v, list) else v for k, v in parsed.items()})
+
+
+class ParseCache:
+    """Memoizes parse_message on the raw message text.
+
+    Results are shared between requests, so they are returned frozen
+    (see freeze_parsed); copy with dict(...) before changing one. Messages
+    longer than max_len characters are parsed without caching.
+    """
+
+    def __init__(self, maxsize=4096, max_len=200):
+        self.max_len = max_len
+        self._cache = LRUCache(maxsize=maxsize)
+
+    def parse(self, raw):
+        if raw is None or len(raw) > self.max_len:
+            return freeze_parsed(parse_message(raw))
+        parsed = self._cache.get(raw)
+        if parsed is None:
+            parsed = freeze_parsed(parse_message(raw))
+            self._cache.put(raw, parsed)
+        return parsed
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
@@ -6,19 +6,24 @@ AWAIT_SELECTION = "await_selection" # list shown, waiting for user to pick
 CONFIRM = "confirm"                 # recipe shown, ask yes/no
 CLOSED = "closed"                   # chat ended after success
 
+def query_key(parsed):
+    """Canonical, hashable form of a search query (ignores order and repeats)."""
+    return (
+        tuple(sorted(set(parsed.get("ingredients") or []))),
+        tuple(sorted(set(parsed.get("exclude") or []))),
+        parsed.get("diet"),
+        parsed.get("cuisine"),
+        parsed.get("time_limit"),
+    )
+
 def is_query_changed(prev_parsed, new_parsed):
     if not prev_parsed:
         return True
-    if set(prev_parsed.get("ingredients") or []) != set(new_parsed.get("ingredients") or []):
-        return True
-    if set(prev_parsed.get("exclude") or []) != set(new_parsed.get("exclude") or []):
-        return True
-    for k in ["diet", "cuisine", "time_limit"]:
-        if prev_parsed.get(k) != new_parsed.get(k):
-            return True
-    return False
+    return query_key(prev_parsed) != query_key(new_parsed)
 
-def pick_from_candidates(cands, selection_number=None, selection_name=None):
+def pick_from_candidates(cands, selection_number=None, selection_name=None, match_fn=None):
+    """Pick by list number, else by name: the shown candidates first, then
+    (if `match_fn` is given) any dish in the catalog via match_fn(name)."""
     if not cands:
         return None
     if selection_number is not None:
@@ -26,13 +31,14 @@ def pick_from_candidates(cands, selection_number=None, selection_name=None):
         if 0 <= idx < len(cands):
             return cands[idx]
     if selection_name:
-        titles = [c["title"] for c in cands]
-        matches = get_close_matches(selection_name.strip().lower(), [t.lower() for t in titles], n=1, cutoff=0.6)
+        by_title = {}
+        for c in cands:
+            by_title.setdefault(c["title"].lower(), c)
+        matches = get_close_matches(selection_name.strip().lower(), list(by_title), n=1, cutoff=0.6)
         if matches:
-            target = matches[0]
-            for c in cands:
-                if c["title"].lower() == target:
-                    return c
+            return by_title[matches[0]]
+        if match_fn:
+            return match_fn(selection_name)
     return None
 
 def build_list_reply(cands):
@@ -49,8 +55,9 @@ def build_list_reply(cands):
 def build_confirm_reply(title):
     return f"Was this recipe for **{title}** helpful? Choose an option below."
 
-def next_turn(state, memory, parsed, search_fn, detail_fn):
+def next_turn(state, memory, parsed, search_fn, detail_fn, match_fn=None):
     """
+    match_fn(name) -> candidate or None: optional catalog-wide dish-name lookup
     Returns: new_state, new_memory, reply_text
     """
     mem = memory or {}
@@ -72,7 +79,8 @@ def next_turn(state, memory, parsed, search_fn, detail_fn):
             chosen = pick_from_candidates(
                 mem.get("last_candidates", []),
                 parsed["selection_number"],
-                parsed["selection_name"]
+                parsed["selection_name"],
+                match_fn
             )
             if chosen:
                 mem["chosen_title"] = chosen["title"]
@@ -131,7 +139,8 @@ def next_turn(state, memory, parsed, search_fn, detail_fn):
         chosen = pick_from_candidates(
             mem.get("last_candidates", []),
             parsed["selection_number"],
-            parsed["selection_name"]
+            parsed["selection_name"],
+            match_fn
         )
         if chosen:
             mem["chosen_title"] = chosen["title"]
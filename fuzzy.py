@@ -0,0 +1,128 @@
+# fuzzy.py — typo-tolerant dish-name lookup over the whole catalog
+import re
+from collections import defaultdict
+
+import numpy as np
+
+_NORM_RE = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_title(s):
+    """'Bibimbap (Veg)' -> 'bibimbap veg'"""
+    return _NORM_RE.sub(" ", str(s or "").lower()).strip()
+
+
+def trigrams(s):
+    s = f"  {s} "
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+def edit_distance(a, b, bound):
+    """Levenshtein distance of a and b, or bound + 1 once it must exceed bound."""
+    if abs(len(a) - len(b)) > bound:
+        return bound + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+        if min(cur) > bound:
+            return bound + 1
+        prev = cur
+    return prev[-1]
+
+
+class TitleMatcher:
+    """Character-trigram index over titles with bounded edit-distance checks.
+
+    A title within d edits of the query shares at least (grams - 3d) of the
+    query's trigrams, so only the rarest (3d + 1) posting lists are needed
+    to generate candidates; the rest are only used to count overlap.
+    """
+
+    def __init__(self, titles):
+        self.titles = list(titles)
+        self._norm = [normalize_title(t) for t in self.titles]
+        self._exact = {}
+        postings = defaultdict(list)
+        for i, t in enumerate(self._norm):
+            if not t:
+                continue
+            self._exact.setdefault(t, i)
+            for g in trigrams(t):
+                postings[g].append(i)
+        self._postings = {g: np.asarray(ids, dtype=np.int64) for g, ids in postings.items()}
+        self._lens = np.array([len(t) for t in self._norm], dtype=np.int64)
+
+    def extend(self, titles):
+        """Index more titles, numbered after the existing ones."""
+        start = len(self.titles)
+        norm = [normalize_title(t) for t in titles]
+        # lengths and texts first: a concurrent match() only reaches new ids via the postings
+        self._lens = np.concatenate([self._lens, np.array([len(t) for t in norm], dtype=np.int64)])
+        self._norm.extend(norm)
+        self.titles.extend(titles)
+        postings = defaultdict(list)
+        for i, t in enumerate(norm, start):
+            if not t:
+                continue
+            self._exact.setdefault(t, i)
+            for g in trigrams(t):
+                postings[g].append(i)
+        merged = dict(self._postings)
+        for g, ids in postings.items():
+            ids = np.asarray(ids, dtype=np.int64)
+            merged[g] = ids if g not in merged else np.concatenate([merged[g], ids])
+        self._postings = merged
+
+    def discard(self, i):
+        """Stop matching title `i` (its id stays reserved)."""
+        t = self._norm[i]
+        self._norm[i] = ""
+        self._lens[i] = 0
+        if self._exact.get(t) == i:
+            del self._exact[t]
+
+    def match(self, query, cutoff=0.85, limit=1):
+        """Indices of the closest titles with similarity >= cutoff, best first.
+
+        similarity = 1 - edit_distance / max(len(query), len(title)), on
+        normalized titles; ties keep catalog order.
+        """
+        q = normalize_title(query)
+        if not q:
+            return []
+        if q in self._exact and limit == 1:
+            return [self._exact[q]]
+
+        # largest distance that can still reach the cutoff for some title length
+        bound = int((1 - cutoff) * len(q) / cutoff)
+        grams = sorted(trigrams(q), key=lambda g: len(self._postings.get(g, ())))
+        need = max(len(grams) - 3 * bound, 1)
+        probe = [self._postings[g] for g in grams[:len(grams) - need + 1] if g in self._postings]
+        if not probe:
+            return []
+        cand = np.unique(np.concatenate(probe))
+        counts = np.zeros(len(cand), dtype=np.int64)
+        for g in grams:
+            p = self._postings.get(g)
+            if p is not None:
+                counts += np.isin(cand, p, assume_unique=True)
+        keep = (counts >= need) & (np.abs(self._lens[cand] - len(q)) <= bound)
+        cand, counts = cand[keep], counts[keep]
+
+        # verify the most promising first; a title missing m of the query's
+        # trigrams is at least ceil(m / 3) edits away, which stops the scan
+        longest = len(q) + bound
+        scored = []
+        for k in np.lexsort((cand, -counts)):
+            i, t = int(cand[k]), self._norm[cand[k]]
+            floor_d = -(-(len(grams) - counts[k]) // 3)
+            if len(scored) >= limit and floor_d / longest > scored[limit - 1][0]:
+                break
+            b = min(bound, int((1 - cutoff) * max(len(q), len(t))))
+            d = edit_distance(q, t, b)
+            if d <= b:
+                scored.append((d / max(len(q), len(t)), i))
+                scored.sort()
+        return [i for _, i in scored[:limit]]
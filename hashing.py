@@ -0,0 +1,81 @@
+# hashing.py — password/answer hashing on a small dedicated pool
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from metrics import Histogram
+
+
+class HashPoolBusy(Exception):
+    """Every hashing slot is taken; the caller should answer 503 right away."""
+
+
+class HashPool:
+    """Runs werkzeug's (deliberately slow) KDFs on `workers` threads.
+
+    hashlib's scrypt/pbkdf2 release the GIL, so hashing uses at most
+    `workers` cores. The calling request thread still waits for its hash,
+    so up to `workers + max_queue` request threads can be held by hashing;
+    keep that well below the server's request threads, or a login burst
+    starves /chat. Beyond that limit calls raise HashPoolBusy at once
+    instead of queueing. A hash still unfinished after `timeout` seconds
+    also raises HashPoolBusy.
+    """
+
+    def __init__(self, workers=2, max_queue=2, timeout=30.0):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="auth-hash")
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.rejected = 0
+        self.latency = Histogram()
+
+    def generate(self, *secrets):
+        """generate_password_hash for each secret; one hash, or a tuple for several."""
+        out = self._run(lambda: [generate_password_hash(s) for s in secrets])
+        return out[0] if len(out) == 1 else tuple(out)
+
+    def check(self, pwhash, secret):
+        return self._run(lambda: check_password_hash(pwhash, secret))
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "pending": self.pending,
+            "rejected": self.rejected,
+            "hash": self.latency.stats(),
+        }
+
+    # ---------- internals ----------
+    def _run(self, fn):
+        # one slot per request; it is freed when the hash finishes, not when
+        # the caller gives up, so abandoned work still counts against the limit
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashPoolBusy()
+        with self._lock:
+            self.pending += 1
+        try:
+            return self._executor.submit(self._timed, fn).result(timeout=self.timeout)
+        except FutureTimeout:
+            with self._lock:
+                self.rejected += 1
+            raise HashPoolBusy() from None
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def _timed(self, fn):
+        t0 = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            self.latency.observe(1000 * (time.perf_counter() - t0))
+            self._slots.release()
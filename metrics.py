@@ -0,0 +1,233 @@
+# metrics.py — in-process latency histograms, counters, Prometheus text and
+# a sampled request profiler. Everything here is per process: under several
+# gunicorn/uvicorn workers each one reports its own numbers.
+import bisect
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# upper bounds in milliseconds; the last bucket is +Inf
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; cheap to update from many threads."""
+
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms):
+        i = bisect.bisect_left(self.buckets, ms)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += ms
+
+    def quantile(self, q):
+        """Estimate from the buckets (linear inside the bucket that holds q)."""
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return 0.0
+        rank, seen = q * total, 0
+        for i, c in enumerate(counts):
+            if c and seen + c >= rank:
+                lo = self.buckets[i - 1] if i else 0.0
+                hi = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lo + (hi - lo) * (rank - seen) / c
+            seen += c
+        return float(self.buckets[-1])
+
+    def snapshot(self):
+        """(per-bucket counts, count, sum) read together."""
+        with self._lock:
+            return list(self.counts), self.count, self.sum
+
+    def stats(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.50), 3),
+            "p95_ms": round(self.quantile(0.95), 3),
+            "p99_ms": round(self.quantile(0.99), 3),
+        }
+
+
+class _Timer:
+    __slots__ = ("hist", "t0")
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(1000 * (time.perf_counter() - self.t0))
+
+
+class LatencyRegistry:
+    """Histograms by name (e.g. "POST /chat"), created on first use."""
+
+    def __init__(self):
+        self._hists = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name):
+        h = self._hists.get(name)
+        if h is None:
+            with self._lock:
+                h = self._hists.setdefault(name, Histogram())
+        return h
+
+    def observe(self, name, ms):
+        self.histogram(name).observe(ms)
+
+    def time(self, name):
+        """Context manager that records the duration of its block under `name`."""
+        return _Timer(self.histogram(name))
+
+    def items(self):
+        with self._lock:
+            return sorted(self._hists.items())
+
+    def stats(self):
+        return {name: h.stats() for name, h in self.items()}
+
+
+class CounterRegistry:
+    """Monotonic counters keyed by a tuple of label values."""
+
+    def __init__(self, labels):
+        self.labels = tuple(labels)
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *values, n=1):
+        with self._lock:
+            self._counts[values] = self._counts.get(values, 0) + n
+
+    def items(self):
+        with self._lock:
+            return sorted(self._counts.items())
+
+
+route_latency = LatencyRegistry()    # name: "METHOD /rule"
+stage_latency = LatencyRegistry()    # name: chat pipeline stage, e.g. "search.filters"
+dialogue_transitions = CounterRegistry(("from", "to"))
+
+
+# ---------- Prometheus text format ----------
+def _labels(pairs):
+    def esc(v):
+        return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+
+def _histogram_lines(metric, label, registry):
+    lines = [f"# TYPE {metric} histogram"]
+    for name, h in registry.items():
+        counts, count, total = h.snapshot()
+        cumulative = 0
+        for bound, c in zip(h.buckets + (None,), counts):
+            cumulative += c
+            le = "+Inf" if bound is None else f"{bound / 1000:g}"
+            lines.append(f"{metric}_bucket{_labels([(label, name), ('le', le)])} {cumulative}")
+        lines.append(f"{metric}_sum{_labels([(label, name)])} {total / 1000:.6f}")
+        lines.append(f"{metric}_count{_labels([(label, name)])} {count}")
+    return lines
+
+
+def prometheus_text(extra=()):
+    """Every registry above in Prometheus exposition format (latencies in
+    seconds). `extra` adds (name, type, help, value) samples, e.g. cache hits."""
+    lines = ["# HELP mika_route_latency_seconds Request latency by route."]
+    lines += _histogram_lines("mika_route_latency_seconds", "route", route_latency)
+    lines.append("# HELP mika_stage_latency_seconds Chat pipeline latency by stage.")
+    lines += _histogram_lines("mika_stage_latency_seconds", "stage", stage_latency)
+    lines.append("# HELP mika_dialogue_transitions_total Dialogue state transitions.")
+    lines.append("# TYPE mika_dialogue_transitions_total counter")
+    for values, n in dialogue_transitions.items():
+        lines.append(f"mika_dialogue_transitions_total{_labels(zip(dialogue_transitions.labels, values))} {n}")
+    for name, kind, help_text, value in extra:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+# ---------- sampled profiling ----------
+class SampledProfiler:
+    """cProfile for a random sample of requests, switchable at runtime.
+
+    The control file (JSON) is re-read at most every `check_every` seconds,
+    so profiling can be turned on or off in every worker without a restart:
+
+        {"rate": 0.01, "dir": "/tmp/mika-profiles", "limit": 100}
+
+    `rate` is the fraction of requests profiled, each written to `dir` as
+    a .prof file (open with pstats or snakeviz); a process stops after
+    `limit` files. A missing file means rate 0 (or `default_rate`).
+    """
+
+    def __init__(self, control_path, default_rate=0.0, out_dir="profiles", limit=100, check_every=5.0):
+        self.control_path = control_path
+        self.default = {"rate": default_rate, "dir": out_dir, "limit": limit}
+        self.config = dict(self.default)
+        self.check_every = check_every
+        self.dumped = 0
+        self._checked = 0.0
+        self._mtime = None
+
+    def start(self):
+        """A running cProfile.Profile if this request is sampled, else None."""
+        now = time.monotonic()
+        if now - self._checked > self.check_every:
+            self._checked = now
+            self._refresh()
+        rate = self.config["rate"]
+        if not rate or self.dumped >= self.config["limit"] or random.random() >= rate:
+            return None
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:   # another profiler is already active on this thread
+            return None
+        return prof
+
+    def stop(self, prof, name):
+        prof.disable()
+        self.dumped += 1
+        out_dir = self.config["dir"]
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_") or "request"
+        try:
+            os.makedirs(out_dir, exist_ok=True)
+            prof.dump_stats(os.path.join(out_dir, f"{time.time_ns()}-{os.getpid()}-{slug}.prof"))
+        except OSError:
+            log.exception("could not write profile for %s", name)
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.control_path).st_mtime_ns
+        except OSError:
+            self.config, self._mtime = dict(self.default), None
+            return
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        try:
+            with open(self.control_path) as f:
+                self.config = {**self.default, **json.load(f)}
+            self.dumped = 0
+        except (OSError, ValueError):
+            log.exception("bad profiler control file %s", self.control_path)
@@ -19,6 +19,10 @@ class User(UserMixin, db.Model):
 
 class ChatSession(db.Model):
     __tablename__ = "chat_sessions"
+    __table_args__ = (
+        # dashboard listing: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+        db.Index("ix_chat_sessions_user_created", "user_id", "created_at", "id"),
+    )
     id = db.Column(db.String(64), primary_key=True)      # reuse your sid string
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
     title = db.Column(db.String(255), default="New chat")
@@ -26,8 +30,19 @@ class ChatSession(db.Model):
 
 class Message(db.Model):
     __tablename__ = "messages"
+    __table_args__ = (
+        # history: WHERE session_id = ? ORDER BY id
+        db.Index("ix_messages_session_id_id", "session_id", "id"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.String(64), db.ForeignKey("chat_sessions.id"), nullable=False)
     role = db.Column(db.String(10), nullable=False)      # 'user' | 'bot'
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+def ensure_indexes():
+    """Add indexes declared above to tables created before they existed.
+    (db.create_all() only creates indexes together with new tables.)"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
@@ -23,6 +23,8 @@ NONVEG_RE = re.compile(r"\b(?:non[-\s]?veg(?:etarian)?|nonvegetarian|n\s*veg|nv)
 VEG_RE    = re.compile(r"\b(?:veg(?:etarian)?)\b", re.I)
 VEGAN_RE  = re.compile(r"\bvegan\b", re.I)
 
+CUISINE_SPLIT_RE = re.compile(r"[\s\-]+")
+
 # Words we never want as ingredients
 STOPWORDS = {
     "the","a","an","and","or","to","of","for","in","on","with","is","are","be","it","this","that",
@@ -42,10 +44,13 @@ def clean_text(s: str) -> str:
     s = re.sub(r"\s+", " ", s).strip()
     return s
 
+TIME_LIMIT_RE = re.compile(r"(?:under|<=?|less\s+than)\s*(\d{1,3})\s*(?:min|mins|minutes?)\b")
+TIME_RE       = re.compile(r"\b(\d{1,3})\s*(?:min|mins|minutes?)\b")
+
 def extract_time(s: str):
-    m = re.search(r"(?:under|<=?|less\s+than)\s*(\d{1,3})\s*(?:min|mins|minutes?)\b", s)
+    m = TIME_LIMIT_RE.search(s)
     if m: return int(m.group(1))
-    m = re.search(r"\b(\d{1,3})\s*(?:min|mins|minutes?)\b", s)
+    m = TIME_RE.search(s)
     if m: return int(m.group(1))
     if "half an hour" in s or "half hour" in s: return 30
     return None
@@ -67,11 +72,148 @@ def strip_diet_terms(s: str):
     s = VEG_RE.sub(" ", s)
     return re.sub(r"\s+", " ", s).strip()
 
+def detect_cuisine(s: str):
+    """First cuisine mentioned in the (cleaned) message, or None."""
+    for part in CUISINE_SPLIT_RE.split(s):
+        if part in CUISINES:
+            return part
+    return None
+
 def tokens(s: str):
     return [t for t in s.split() if t and t not in STOPWORDS and not t.isdigit() and len(t) > 1]
 
-# ---- Main parser ----
+# ---- Single-pass lexer ----
+# parse_message() cleans the message once and then classifies each token
+# with dictionary lookups: diet phrases, intent words, cuisine, selection
+# number, "without ..." / "no x" exclusions and ingredients in one scan.
+# Hyphenated tokens mixing diet/exclusion words in unusual ways, and a
+# couple of degenerate diet sequences, go to _parse_message_regex (the
+# original multi-pass parser), which produces identical output.
+CLEAN_RE = re.compile(r"[^a-z0-9\-]+")
+FIX_RE   = re.compile("|".join(map(re.escape, COMMON_FIXES)))
+
+DIET_TOKENS = {
+    "vegan": "vegan",
+    "veg": "veg", "vegetarian": "veg",
+    "nonveg": "non-veg", "nonvegetarian": "non-veg", "non-veg": "non-veg",
+    "non-vegetarian": "non-veg", "nveg": "non-veg", "nv": "non-veg",
+}
+# two-token diet phrases: "non veg", "non vegetarian", "n veg"
+DIET_PAIRS = {("non", "veg"), ("non", "vegetarian"), ("n", "veg")}
+DIET_PARTS = {"veg", "vegetarian", "vegan", "nv", "nveg", "nonveg", "nonvegetarian"}
+CTRL_WORDS = {"under","within","time","minutes","minute","mins","min","without","no"}
+LEADING_LETTERS_RE = re.compile(r"[a-z]*")
+
+def _needs_regex_parser(words):
+    for i, w in enumerate(words):
+        if "-" in w and w not in DIET_TOKENS:
+            parts = w.split("-")
+            if DIET_PARTS.intersection(parts) or "without" in w or parts[-1] in ("no", "non", "n"):
+                return True
+        elif w == "n" and i + 1 < len(words) and words[i + 1] == "vegan":
+            return True
+    return False
+
+def _clean(raw: str) -> str:
+    s = (raw or "").lower().strip()
+    if FIX_RE.search(s):
+        # rare: keep clean_text's sequential replacement semantics
+        for w, r in COMMON_FIXES.items():
+            s = s.replace(w, r)
+    return CLEAN_RE.sub(" ", s).strip()
+
 def parse_message(raw: str):
+    s = _clean(raw)
+    words = s.split()
+    if _needs_regex_parser(words):
+        return _parse_message_regex(raw)
+
+    # Diet first (so 'non veg' doesn't split into 'non' + 'veg'); one pass
+    diets = set()
+    rest = []
+    i = 0
+    while i < len(words):
+        w = words[i]
+        if i + 1 < len(words) and (w, words[i + 1]) in DIET_PAIRS:
+            diets.add("non-veg"); i += 2; continue
+        d = DIET_TOKENS.get(w)
+        if d:
+            diets.add(d)
+        else:
+            rest.append(w)
+        i += 1
+    diet = next((d for d in ("vegan", "non-veg", "veg") if d in diets), None)
+
+    # Intent flags
+    wset = set(rest)
+    is_greet = not wset.isdisjoint(GREETINGS) and len(wset) <= 3
+    is_yes   = not wset.isdisjoint(YES_WORDS) or ("go ahead" in s or "looks good" in s)
+    is_no    = not wset.isdisjoint(NO_WORDS)  or ("not helpful" in s or "other options" in s or "see other" in s)
+
+    # Selection by number (e.g., "2")
+    selection_number = None
+    if len(rest) == 1 and len(rest[0]) <= 2 and rest[0].isdigit():
+        selection_number = int(rest[0])
+
+    # Possible selection by dish name (short text, not a pure yes/no/greet)
+    maybe_name = None
+    if not is_greet and not is_yes and not is_no:
+        if 1 <= len(rest) <= 6:
+            maybe_name = raw.strip()
+
+    cuisine = detect_cuisine(s)
+    time_limit = extract_time(s) if ("min" in s or "half" in s) else None
+
+    # Exclusions: "without onion, garlic" (letters up to the first digit or
+    # hyphen) and "no garlic"
+    exclude_ingredients = set()
+    n = len(rest)
+    i = 0
+    while i < n:
+        if rest[i] == "without" and i + 1 < n and rest[i + 1][:1].isalpha():
+            j = i + 1
+            while j < n:
+                run = LEADING_LETTERS_RE.match(rest[j]).group()
+                if run:
+                    exclude_ingredients.add(run)
+                if run != rest[j]:
+                    break
+                j += 1
+            i = j + 1
+        else:
+            i += 1
+    i = 0
+    while i < n - 1:
+        if rest[i] == "no":
+            nxt = rest[i + 1]
+            run = LEADING_LETTERS_RE.match(nxt).group()
+            if run and (len(run) == len(nxt) or nxt[len(run)] == "-"):
+                exclude_ingredients.add(run)
+                i += 2
+                continue
+        i += 1
+
+    # Ingredients from the remaining text (after removing diet words)
+    ing = [t for t in rest
+           if t not in STOPWORDS and not t.isdigit() and len(t) > 1
+           and t not in CTRL_WORDS and t not in exclude_ingredients]
+
+    return {
+        "raw": raw,
+        "is_greet": is_greet,
+        "is_yes": is_yes,
+        "is_no": is_no,
+        "selection_number": selection_number,
+        "selection_name": maybe_name,
+        "diet": diet,                 # 'veg' | 'non-veg' | 'vegan' | None
+        "cuisine": cuisine,           # or None
+        "time_limit": time_limit,     # or None
+        "ingredients": ing,           # list[str]
+        "exclude": sorted(exclude_ingredients)
+    }
+
+# ---- Reference (multi-pass regex) parser ----
+def _parse_message_regex(raw: str):
     s = clean_text(raw)
 
     # Detect diet first (so 'non veg' doesn't split into 'non' + 'veg')
@@ -95,9 +237,7 @@ def parse_message(raw: str):
             maybe_name = raw.strip()
 
     # Cuisine
-    cuisine = None
-    for c in CUISINES:
-        if re.search(rf"\b{c}\b", s): cuisine = c; break
+    cuisine = detect_cuisine(s)
 
     # Time
     time_limit = extract_time(s)
@@ -112,8 +252,7 @@ def parse_message(raw: str):
         exclude_ingredients.add(ex.strip())
 
     # Ingredients from the remaining text (after removing diet words)
-    ctrl = {"under","within","time","minutes","minute","mins","min","without","no"}
-    ing = [t for t in tokens(s_wo_diet) if t not in ctrl and t not in exclude_ingredients]
+    ing = [t for t in tokens(s_wo_diet) if t not in CTRL_WORDS and t not in exclude_ingredients]
 
     return {
         "raw": raw,
@@ -0,0 +1,175 @@
+# persistence.py — write-behind storage of chat turns for logged-in users
+import atexit
+import logging
+import os
+import queue
+import re
+import threading
+from datetime import datetime
+
+try:
+    from models import db, ChatSession, Message
+except ImportError:
+    from model import db, ChatSession, Message
+
+from metrics import stage_latency
+
+log = logging.getLogger(__name__)
+
+
+def session_title(msg):
+    return (re.sub(r"\s+", " ", msg or "").strip() or "New chat")[:40]
+
+
+class ChatWriter:
+    """Persists the ChatSession/Message rows of a /chat turn in one transaction.
+
+    mode="strict": the turn is committed before record_turn returns (tests).
+    mode="async":  turns go to a bounded queue; a background thread commits
+                   up to batch_size queued turns per transaction. When the
+                   queue is full the turn is written inline instead of dropped.
+    Pending turns are flushed at interpreter exit.
+
+    flush(sid=..., user_id=...) waits, up to `timeout` seconds, only for the
+    turns of that chat or user that were queued before the call.
+
+    Each process has its own queue, and flush() waits only for this
+    process's turns. With several workers, a history page served by another
+    worker can miss turns that are still queued (up to a batch interval), so
+    read-your-writes holds only with one worker or with mode="strict".
+    """
+
+    def __init__(self, app, mode="async", max_queue=10000, batch_size=200):
+        if mode not in ("async", "strict"):
+            raise ValueError(f"unknown chat write mode: {mode}")
+        self.app = app
+        self.mode = mode
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # sequence numbers: issued at enqueue, committed by the writer thread
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._committed = 0
+        self._last_by_sid = {}
+        self._last_by_user = {}
+        atexit.register(self.close)
+
+    def record_turn(self, sid, user_id, user_msg, bot_reply):
+        now = datetime.utcnow()
+        turn = (sid, user_id, user_msg, bot_reply, now)
+        if self.mode == "strict":
+            self._write([turn])
+            return
+        self._ensure_thread()
+        with self._cond:
+            try:
+                # enqueue under the lock so queue order matches sequence order
+                self._queue.put_nowait((self._seq + 1, turn))
+            except queue.Full:
+                full = True
+            else:
+                full = False
+                self._seq += 1
+                self._last_by_sid[sid] = self._last_by_user[user_id] = self._seq
+        if full:
+            log.warning("chat write queue full; writing turn for %s inline", sid)
+            self._write([turn])
+
+    def flush(self, sid=None, user_id=None, timeout=2.0):
+        """Wait until the turns already queued for `sid` / `user_id` (or, with
+        neither, every queued turn) are committed. False on timeout."""
+        if self.mode != "async" or self._thread is None:
+            return True
+        with self._cond:
+            if sid is None and user_id is None:
+                target = self._seq
+            else:
+                target = max(self._last_by_sid.get(sid, 0), self._last_by_user.get(user_id, 0))
+            done = self._cond.wait_for(lambda: self._committed >= target, timeout)
+        if not done:
+            log.warning("chat write flush timed out after %.1fs", timeout)
+        return done
+
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    # ---------- internals ----------
+    def _ensure_thread(self):
+        # threads do not survive gunicorn's fork; start one per process
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="chat-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            items = [t for t in batch if t is not None]
+            try:
+                if items:
+                    self._write([turn for _, turn in items])
+            finally:
+                if items:
+                    self._mark_committed(items[-1][0])
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _mark_committed(self, seq):
+        with self._cond:
+            self._committed = seq
+            # forget chats/users with nothing left in flight
+            for last in (self._last_by_sid, self._last_by_user):
+                for key in [k for k, v in last.items() if v <= seq]:
+                    del last[key]
+            self._cond.notify_all()
+
+    def _write(self, turns):
+        with self.app.app_context():
+            try:
+                for turn in turns:
+                    self._apply(*turn)
+                with stage_latency.time("db_commit"):
+                    db.session.commit()
+            except Exception:
+                db.session.rollback()
+                if len(turns) == 1:
+                    log.exception("failed to persist chat turn for %s", turns[0][0])
+                else:
+                    # isolate the bad turn; commit the others one by one
+                    for turn in turns:
+                        self._write([turn])
+            finally:
+                db.session.remove()
+
+    def _apply(self, sid, user_id, user_msg, bot_reply, at):
+        cs = db.session.get(ChatSession, sid)
+        if cs is None:
+            # title is the first user msg (trimmed) if available
+            cs = ChatSession(id=sid, user_id=user_id, title=session_title(user_msg), created_at=at)
+            db.session.add(cs)
+        elif cs.user_id != user_id:
+            log.warning("chat %s belongs to another user; not persisting turn", sid)
+            return
+        elif not cs.title and user_msg:
+            cs.title = session_title(user_msg)
+        if user_msg:
+            db.session.add(Message(session_id=sid, role="user", content=user_msg, created_at=at))
+        if bot_reply:
+            db.session.add(Message(session_id=sid, role="bot", content=bot_reply, created_at=at))
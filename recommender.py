@@ -1,128 +1,904 @@
+import bisect
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import threading
+from collections.abc import Mapping
+
 import pandas as pd
 import numpy as np
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+
+from fuzzy import TitleMatcher
+from metrics import stage_latency
+from nlp_utils import CUISINES
+from store import RecipeStore, StringColumn, _pack_strings, _unpack_strings
+
+# Query/exclude terms come out of nlp_utils.clean_text, so they only ever
+# contain these characters; any substring hit lies inside one such run.
+_ING_WORD_RE = re.compile(r"[a-z0-9\-]+")
+_EMPTY = np.empty(0, dtype=np.int64)
+
+SNAPSHOT_FORMAT = 2
+_SEMANTIC_WEIGHT = 0.5   # share of the LSA cosine in mode="hybrid" scores
+_MANY_PAIRS = 4_000_000  # (query, row) pairs search_many scores per batch
+_HYBRID_CANDIDATES = 20  # lexical candidates per result slot that mode="hybrid" re-scores
+_SOURCE_COLUMNS = ["title", "ingredients", "steps", "time", "cuisine", "diet"]
+
+log = logging.getLogger(__name__)
+
+
+def default_index_path(data_path):
+    """data/recipes.csv -> data/recipes.index"""
+    return os.path.splitext(data_path)[0] + ".index"
+
+
+def _source_stamp(data_path):
+    st = os.stat(data_path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _top_k(rows, score, k):
+    """Rows of the k best scores, best first; equal scores keep catalog order."""
+    if len(rows) > k:
+        # partial selection; keep every row tied with the k-th score so the
+        # final ordering does not depend on argpartition's tie handling
+        kth = -np.partition(-score, k - 1)[k - 1]
+        sel = score >= kth
+        rows, score = rows[sel], score[sel]
+    return rows[np.lexsort((rows, -score))[:k]]
+
+
+def _blend(sim, counts, max_count):
+    """Final score: similarity plus the ingredient-overlap boost, which is
+    normalized by the largest overlap of any row (0 = no row overlaps)."""
+    if not max_count:
+        return sim
+    return 0.85 * sim + 0.15 * (counts / float(max_count))
+
+
+def _norm_diet(x: str) -> str:
+    """Normalized diet category (exact match filtering)"""
+    s = str(x or "").strip().lower()
+    s = s.replace(" ", "").replace("-", "").replace("_", "")
+    if s in {"veg", "vegetarian", "veggie"}:
+        return "veg"
+    if s in {"nonveg", "nonvegetarian", "egg", "eggetarian", "chicken", "fish", "mutton", "prawn"}:
+        return "non-veg"
+    if s in {"vegan"}:
+        return "vegan"
+    return ""
+
+
+def _prepare(df):
+    """Add missing columns and the combined search text to `df` in place."""
+    # Ensure required columns exist
+    for col in _SOURCE_COLUMNS:
+        if col not in df.columns:
+            df[col] = "" if col != "time" else 0
+
+    # Unified lowercase text for vector search
+    df["combined"] = (
+        df["title"].fillna("") + " " +
+        df["ingredients"].fillna("") + " " +
+        df["steps"].fillna("") + " " +
+        df["cuisine"].fillna("") + " " +
+        df["diet"].fillna("")
+    ).str.lower()
+    return df
+
+
+def _ingredient_postings(ingredients, start=0):
+    """ingredient word -> sorted row ids (posting list), numbering rows from `start`"""
+    postings = {}
+    for i, text in enumerate(ingredients, start):
+        for w in set(_ING_WORD_RE.findall(text.lower())):
+            postings.setdefault(w, []).append(i)
+    return {w: np.asarray(rows, dtype=np.int64) for w, rows in postings.items()}
+
+
+def _diet_masks(store):
+    """Row masks per normalized diet category."""
+    return {d: store.diet.mask(lambda c, d=d: _norm_diet(c) == d) for d in ("veg", "non-veg", "vegan")}
+
+
+def _cuisine_rows(store, cuisine):
+    """Rows whose cuisine mentions `cuisine` as a word (one regex per category)."""
+    pattern = re.compile(rf"\b{re.escape(cuisine)}\b")
+    return store.cuisine.mask(lambda c: pattern.search(c.lower()))
+
+
+class _SortedVocabulary(Mapping):
+    """vectorizer.vocabulary_ of a loaded snapshot: term -> column by binary
+    search over the memory-mapped terms, which the vectorizer numbers in
+    sorted order, instead of a dict built in every process."""
+
+    def __init__(self, terms):
+        self.terms = terms   # StringColumn
+        self._seen = {}      # term -> column of recent lookups (-1: not a term)
+
+    def __getitem__(self, term):
+        i = self._seen.get(term)
+        if i is None:
+            terms = self.terms
+            i = bisect.bisect_left(terms, term)
+            if i == len(terms) or terms[i] != term:
+                i = -1
+            if len(self._seen) >= 65536:
+                self._seen.clear()
+            self._seen[term] = i
+        if i < 0:
+            raise KeyError(term)
+        return i
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __iter__(self):
+        return iter(self.terms)
+
+
+class _Delta:
+    """Rows added since the index was fitted or loaded; row ids from `start` on.
+
+    Kept apart from the main arrays, so an addition copies only the rows
+    added so far; compaction and snapshot saves merge them. add_recipes
+    publishes a new instance with one assignment, so a search sees the
+    added rows' vectors, postings and filter arrays together.
+    """
+
+    def __init__(self, start, store, tfidf, live, diet_masks, cuisine_masks, postings):
+        self.start = start
+        self.store = store
+        self.tfidf = tfidf
+        self.csc = tfidf.tocsc()
+        self.live = live
+        self.diet_masks = diet_masks
+        self.cuisine_masks = cuisine_masks   # memo, like RecipeRecommender._cuisine_masks
+        self.postings = postings             # ingredient word -> row ids (absolute)
+        self.time = store.time
+
+    @classmethod
+    def first(cls, start, added, added_tfidf):
+        return cls(start, added, added_tfidf, np.ones(len(added), dtype=bool), _diet_masks(added), {},
+                   _ingredient_postings(added.ingredients, start=start))
+
+    def __len__(self):
+        return len(self.live)
+
+    def extended(self, added, added_tfidf):
+        """Copy with the RecipeStore `added` (vectorized as `added_tfidf`) appended."""
+        postings = dict(self.postings)
+        for w, ids in _ingredient_postings(added.ingredients, start=self.start + len(self)).items():
+            old = postings.get(w)
+            postings[w] = ids if old is None else np.concatenate([old, ids])
+        added_diets = _diet_masks(added)
+        return _Delta(
+            self.start, self.store.concatenated(added),
+            sparse.vstack([self.tfidf, added_tfidf], format="csr"),
+            np.concatenate([self.live, np.ones(len(added), dtype=bool)]),
+            {d: np.concatenate([m, added_diets[d]]) for d, m in self.diet_masks.items()},
+            {c: np.concatenate([m, _cuisine_rows(added, c)]) for c, m in self.cuisine_masks.items()},
+            postings,
+        )
+
+    def cuisine_mask(self, cuisine):
+        mask = self.cuisine_masks.get(cuisine)
+        if mask is None:
+            mask = _cuisine_rows(self.store, cuisine)
+            self.cuisine_masks[cuisine] = mask
+        return mask
+
 
 class RecipeRecommender:
-    def __init__(self, data_path="data/recipes.csv"):
-        self.df = pd.read_csv(data_path)
-
-        # Ensure required columns exist
-        for col in ["title", "ingredients", "steps", "time", "cuisine", "diet"]:
-            if col not in self.df.columns:
-                self.df[col] = "" if col != "time" else 0
-
-        # Normalized diet category (exact match filtering)
-        def norm_diet(x: str) -> str:
-            s = str(x or "").strip().lower()
-            s = s.replace(" ", "").replace("-", "").replace("_", "")
-            if s in {"veg", "vegetarian", "veggie"}:
-                return "veg"
-            if s in {"nonveg", "nonvegetarian", "egg", "eggetarian", "chicken", "fish", "mutton", "prawn"}:
-                return "non-veg"
-            if s in {"vegan"}:
-                return "vegan"
-            return ""
-
-        self.df["diet_norm"] = self.df["diet"].map(norm_diet)
-
-        # Unified lowercase text for vector search
-        self.df["combined"] = (
-            self.df["title"].fillna("") + " " +
-            self.df["ingredients"].fillna("") + " " +
-            self.df["steps"].fillna("") + " " +
-            self.df["cuisine"].fillna("") + " " +
-            self.df["diet"].fillna("")
-        ).str.lower()
+    _warned_semantic = False   # the lexical fallback is logged once per process
+
+    def __init__(self, data_path="data/recipes.csv", index_path=None, use_snapshot=True):
+        """Open the snapshot at `index_path` if it is fresh, else fit from the CSV."""
+        self.data_path = data_path
+        self.index_path = index_path or default_index_path(data_path)
+        if not (use_snapshot and self._load_snapshot()):
+            self._fit(pd.read_csv(data_path))
+
+    def _fit(self, df):
+        # the DataFrame is only needed to build the store and the vectors
+        df = _prepare(df)
+        self._store = RecipeStore.from_frame(df)
+        self._fit_rows = len(df)
+        self._init_state()
 
         self.vectorizer = TfidfVectorizer(stop_words="english", ngram_range=(1, 2), min_df=1)
-        self.tfidf = self.vectorizer.fit_transform(self.df["combined"])
+        self.tfidf = self.vectorizer.fit_transform(df["combined"])
+        # Column-major copy: a query only touches the columns of its own terms.
+        # Rows added later live in _delta (see _Delta) until the next compaction.
+        self._tfidf_csc = self.tfidf.tocsc()
+        self._delta = None
 
-    # ---------- helpers ----------
-    def _filter_by_diet(self, mask, diet):
-        """diet ∈ {'veg','non-veg','vegan', None} — exact category filtering"""
-        if not diet:
-            return mask
-        dn = self.df["diet_norm"]
-        if diet == "veg":
-            mask &= (dn == "veg")
-        elif diet == "non-veg":
-            mask &= (dn == "non-veg")
-        elif diet == "vegan":
-            mask &= (dn == "vegan")
+        self._build_ingredient_index()
+        self._build_filter_index()
+        self._build_title_index()
+
+    def _init_state(self):
+        self._write_lock = threading.Lock()
+        self._generation = 0   # bumped by every add/remove
+        self._shards = None    # shards.ShardSet serving search(), if attached
+        self._semantic = None  # semantic.SemanticIndex for mode="semantic"/"hybrid", if built
+
+    # ---------- incremental updates ----------
+    def add_recipes(self, rows, replace=True):
+        """Add recipes (DataFrame or list of dicts) without refitting; returns how many.
+
+        New rows are vectorized with the fitted vocabulary and idf (terms
+        unseen at fit time only count after compaction) and kept with their
+        store rows, filter arrays and posting lists in a _Delta; the main
+        arrays are not copied, so an addition costs O(rows added since the
+        last compaction). With `replace`, a recipe whose title is already
+        in the catalog supersedes the old one.
+
+        Existing row ids never change. Structures that map row ids to data
+        are published before the ones that produce row ids, so a concurrent
+        search sees either the old or the new rows, never a torn mix.
+        """
+        rows = _prepare(pd.DataFrame(rows).reset_index(drop=True))
+        if rows.empty:
+            return 0
+        added = RecipeStore.from_frame(rows)
+        added_tfidf = self.vectorizer.transform(rows["combined"])
+        title = list(added.title)
+        with self._write_lock:
+            self._generation += 1
+            n, k = len(self._store), len(rows)
+            delta = self._delta
+            delta = _Delta.first(n, added, added_tfidf) if delta is None else delta.extended(added, added_tfidf)
+            if replace:
+                self._titles()   # from the rows before this call; the new ones are indexed below
+
+            # --- row id -> data ---
+            self._store = self._store.parts()[0].extended(delta.store)
+            replaced = {}
+            if replace:
+                replaced = {key: self._title_rows(key) for key in {t.lower() for t in title if t}}
+                for ids in replaced.values():
+                    self._tombstone(ids, delta)
+
+            # --- producers of row ids ---
+            self._delta = delta
+            for key in replaced:
+                self._discard_title(key, keep_index=True)
+            if self._title_index is not None:
+                self._index_titles(self._title_index, self._title_dups, n, replace=replace)
+            if self._title_matcher is not None:
+                self._title_matcher.extend(title)
+            if self._semantic is not None:
+                self._semantic = self._semantic.extended(added_tfidf)
+            self._term_rows = {}
+        return k
+
+    def remove_recipes(self, titles):
+        """Drop recipes by title (case-insensitive); returns how many rows were removed.
+
+        Rows are only tombstoned: they stop matching searches, title lookups
+        and match_title right away and are physically dropped by compacted().
+        """
+        with self._write_lock:
+            self._generation += 1
+            removed = 0
+            for key in {str(t).lower() for t in titles}:
+                removed += self._tombstone(self._title_rows(key), self._delta)
+                self._discard_title(key)
+        return removed
+
+    def _tombstone(self, ids, delta):
+        """Mark rows removed, in place; returns how many were live."""
+        ids = np.asarray(ids, dtype=np.int64)
+        n = len(self._live)
+        main, added = ids[ids < n], ids[ids >= n] - n
+        killed = int(np.count_nonzero(self._live[main]))
+        self._live[main] = False
+        if len(added):
+            killed += int(np.count_nonzero(delta.live[added]))
+            delta.live[added] = False
+        return killed
+
+    def _all_live(self):
+        delta = self._delta
+        return self._live if delta is None else np.concatenate([self._live, delta.live])
+
+    def _all_tfidf(self):
+        delta = self._delta
+        return self.tfidf if delta is None else sparse.vstack([self.tfidf, delta.tfidf], format="csr")
+
+    def drift(self):
+        """Rows added or removed since the last fit, as a fraction of the fitted rows."""
+        delta = self._delta
+        dead = np.count_nonzero(~self._live) + (0 if delta is None else np.count_nonzero(~delta.live))
+        changed = len(self._store) - self._fit_rows + int(dead)
+        return changed / max(self._fit_rows, 1)
+
+    def appended(self, rows):
+        """Copy of this recommender with the DataFrame `rows` added at the end.
+
+        Like add_recipes(rows, replace=False), but this instance is left
+        untouched, so requests already using it are unaffected.
+        """
+        new = object.__new__(RecipeRecommender)
+        new.__dict__.update(self.__dict__)
+        new._init_state()
+        new._semantic = self._semantic   # add_recipes extends it
+        new._live = self._live.copy()   # tombstones are written in place
+        if self._title_index is not None:   # else the copy builds its own on first use
+            new._title_index = dict(self._title_index)
+            new._title_dups = {key: list(ids) for key, ids in self._title_dups.items()}
+        new._title_matcher = None
+        new.add_recipes(rows, replace=False)
+        return new
+
+    def compacted(self):
+        """Fresh index of the live rows: tombstones dropped, vocabulary and idf refit."""
+        store = self._store
+        live = np.flatnonzero(self._all_live()[:len(store)])
+        new = object.__new__(RecipeRecommender)
+        new.data_path, new.index_path = self.data_path, self.index_path
+        new._fit(store.to_frame(live))
+        if self._semantic is not None:
+            new.build_semantic(dims=self._semantic.dims)
+        return new
+
+    def build_semantic(self, dims=64, list_size=256):
+        """Fit LSA vectors and their IVF index (see semantic.py) for the current rows.
+
+        The build runs outside the write lock; rows added meanwhile are
+        projected into the new index before it is published.
+        """
+        from semantic import SemanticIndex
+        with self._write_lock:
+            main, delta = self.tfidf, self._delta
+        tfidf = main if delta is None else sparse.vstack([main, delta.tfidf], format="csr")
+        index = SemanticIndex.build(tfidf, dims=dims, list_size=list_size)
+        with self._write_lock:
+            delta = self._delta
+            if len(self._store) > len(index):
+                index = index.extended(delta.tfidf[len(index) - delta.start:])
+            self._semantic = index
+
+    def _subset(self, lo, hi, live=None):
+        """Rows lo..hi as their own recommender, sharing this one's vocabulary and idf
+        (`live`: their tombstone mask, default the current one)."""
+        new = object.__new__(RecipeRecommender)
+        new.data_path, new.index_path = self.data_path, self.index_path
+        new._store = self._store.slice(lo, hi)
+        new.vectorizer = self.vectorizer
+        new.tfidf = self._all_tfidf()[lo:hi]
+        new._tfidf_csc = new.tfidf.tocsc()
+        new._delta = None
+        new._fit_rows = hi - lo
+        new._init_state()
+        new._build_ingredient_index()
+        new._build_filter_index()
+        new._live = (self._all_live()[lo:hi] if live is None else live).copy()
+        new._build_title_index()
+        return new
+
+    def _title_rows(self, key):
+        first = self._titles().get(key)
+        return [] if first is None else [first] + self._title_dups.get(key, [])
+
+    def _discard_title(self, key, keep_index=False):
+        """Forget every row titled `key` (the index entry is left for the caller to overwrite with keep_index)."""
+        matcher = self._title_matcher
+        if matcher is not None:
+            for i in self._title_rows(key):
+                matcher.discard(i)
+        self._title_dups.pop(key, None)
+        if not keep_index:
+            self._title_index.pop(key, None)
+
+    # ---------- snapshot ----------
+    def save_snapshot(self, index_path=None):
+        """Write the fitted index to `index_path` (atomically replaces a previous one)."""
+        index_path = index_path or self.index_path
+        tmp = f"{index_path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        def put(name, arr):
+            np.save(os.path.join(tmp, name + ".npy"), np.ascontiguousarray(arr))
+
+        # rows in the delta are merged in; the loaded index starts without one
+        delta = self._delta
+        tfidf = self._all_tfidf()
+        csc = self._tfidf_csc if delta is None else tfidf.tocsc()
+        for name, mat in (("tfidf", tfidf), ("tfidf_csc", csc)):
+            put(name + "_data", mat.data)
+            put(name + "_indices", mat.indices)
+            put(name + "_indptr", mat.indptr)
+        put("idf", self.vectorizer.idf_)
+        vocab = self.vectorizer.vocabulary_
+        if isinstance(vocab, _SortedVocabulary):
+            buf, off = vocab.terms.buf, vocab.terms.offsets
+        else:
+            buf, off = _pack_strings(sorted(vocab, key=vocab.get))
+        put("terms_buf", buf)
+        put("terms_off", off)
+
+        self._store.save(put)
+        put("live", self._all_live())
+
+        postings = self._ing_postings
+        if delta is not None:
+            postings = dict(postings)
+            for w, ids in delta.postings.items():
+                old = postings.get(w)
+                postings[w] = ids if old is None else np.concatenate([old, ids])
+        words = list(postings)
+        buf, off = _pack_strings(words)
+        put("ing_words_buf", buf)
+        put("ing_words_off", off)
+        plen = np.array([len(postings[w]) for w in words], dtype=np.int64)
+        put("ing_indptr", np.concatenate([[0], np.cumsum(plen)]))
+        put("ing_rows", np.concatenate([postings[w] for w in words]) if words else _EMPTY)
+
+        cuisines = sorted(self._cuisine_masks)
+        masks = [self._full_mask(self._cuisine_masks[c], delta, lambda d, c=c: d.cuisine_mask(c)) for c in cuisines]
+        put("cuisine_masks", np.array(masks, dtype=bool).reshape(len(cuisines), -1))
+
+        meta = {
+            "format": SNAPSHOT_FORMAT,
+            "source": self._source_or_none(),
+            "rows": len(self._store),
+            "fit_rows": self._fit_rows,
+            "tfidf_shape": list(tfidf.shape),
+            "cuisines": cuisines,
+        }
+        if self._semantic is not None:
+            self._semantic.save(put)
+            meta["semantic"] = {"dims": self._semantic.dims, "lists": len(self._semantic.centroids)}
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        old = f"{index_path}.old-{os.getpid()}"
+        if os.path.exists(index_path):
+            os.rename(index_path, old)
+        os.rename(tmp, index_path)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def _source_or_none(self):
+        try:
+            return _source_stamp(self.data_path)
+        except (OSError, TypeError):
+            return None   # no CSV behind this index (shards, shipped snapshots)
+
+    @classmethod
+    def from_snapshot(cls, index_path):
+        """Open the snapshot at `index_path` without comparing it to a CSV (shards)."""
+        rec = object.__new__(cls)
+        rec.data_path, rec.index_path = None, index_path
+        if not rec._load_snapshot(check_source=False):
+            raise FileNotFoundError(f"no recipe index at {index_path}")
+        return rec
+
+    def _load_snapshot(self, check_source=True):
+        """Map a fresh snapshot into memory; False if missing or stale."""
+        try:
+            with open(os.path.join(self.index_path, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        fresh = meta.get("format") == SNAPSHOT_FORMAT
+        if fresh and check_source:
+            try:
+                fresh = meta.get("source") == _source_stamp(self.data_path)
+            except OSError:
+                fresh = os.path.exists(self.index_path)  # snapshot shipped without its CSV
+        if not fresh:
+            log.warning("Recipe index %s is stale; fitting from %s", self.index_path, self.data_path)
+            return False
+
+        def get(name):
+            # read-only memmap: pages are shared between workers via the page cache
+            return np.load(os.path.join(self.index_path, name + ".npy"), mmap_mode="r")
+
+        shape = tuple(meta["tfidf_shape"])
+        self.tfidf = sparse.csr_matrix(
+            (get("tfidf_data"), get("tfidf_indices"), get("tfidf_indptr")), shape=shape, copy=False)
+        self._tfidf_csc = sparse.csc_matrix(
+            (get("tfidf_csc_data"), get("tfidf_csc_indices"), get("tfidf_csc_indptr")), shape=shape, copy=False)
+        self._delta = None
+        self._fit_rows = meta.get("fit_rows", shape[0])
+        self._init_state()
+
+        self.vectorizer = TfidfVectorizer(stop_words="english", ngram_range=(1, 2), min_df=1)
+        self.vectorizer.vocabulary_ = _SortedVocabulary(StringColumn(get("terms_buf"), get("terms_off")))
+        self.vectorizer.idf_ = np.asarray(get("idf"))
+
+        self._store = RecipeStore.load(get)
+
+        words = _unpack_strings(get("ing_words_buf"), get("ing_words_off"))
+        indptr, rows = get("ing_indptr"), get("ing_rows")
+        self._ing_postings = {w: rows[indptr[i]:indptr[i + 1]] for i, w in enumerate(words)}
+        self._term_rows = {}
+
+        self._diet_masks = _diet_masks(self._store)
+        cmasks = get("cuisine_masks")
+        self._cuisine_masks = {c: cmasks[i] for i, c in enumerate(meta["cuisines"])}
+        self._time_vals = self._store.time
+        live_path = os.path.join(self.index_path, "live.npy")
+        self._live = np.load(live_path) if os.path.exists(live_path) else np.ones(shape[0], dtype=bool)
+        self._build_title_index()
+        if "semantic" in meta:
+            from semantic import SemanticIndex
+            self._semantic = SemanticIndex.load(get)
+        return True
+
+    # ---------- index ----------
+    def _build_ingredient_index(self):
+        self._ing_postings = _ingredient_postings(self._store.ingredients)
+        self._term_rows = {}
+
+    def _build_filter_index(self):
+        """Per-value boolean masks for diet/cuisine; time is compared per candidate."""
+        self._diet_masks = _diet_masks(self._store)
+
+        self._cuisine_masks = {}
+        for c in CUISINES:
+            self._cuisine_mask(c)
+
+        # store.NO_TIME (missing/non-numeric time) never satisfies `<= limit`
+        self._time_vals = self._store.time
+        self._live = np.ones(len(self._store), dtype=bool)   # False = removed (tombstone)
+
+    def _build_title_index(self):
+        self._title_index = None     # built on first use (_titles)
+        self._title_dups = None
+        self._title_matcher = None   # built by warm() or the first match_title()
+
+    def _titles(self):
+        """The title index, built on first use; the caller holds _write_lock."""
+        if self._title_index is None:
+            index, dups = {}, {}
+            self._index_titles(index, dups, 0)
+            self._title_dups = dups
+            self._title_index = index
+        return self._title_index
+
+    def _index_titles(self, index, dups, start, replace=False):
+        # lowercased title -> row id; duplicate titles resolve to the first
+        # row (the later ones go to `dups`) unless `replace` is set
+        seen = set()
+        titles, live, delta = self._store.title, self._live, self._delta
+        n = len(live)
+        for i, t in enumerate(titles.slice(start, len(titles)), start):
+            if not t or not (live[i] if i < n else delta.live[i - n]):
+                continue
+            key = t.lower()
+            if replace and key not in seen:
+                seen.add(key)
+                index[key] = i
+            elif index.setdefault(key, i) != i:
+                dups.setdefault(key, []).append(i)
+
+    def _cuisine_mask(self, cuisine):
+        """Mask of the main rows (rows in the delta: _Delta.cuisine_mask)."""
+        masks = self._cuisine_masks
+        mask = masks.get(cuisine)
+        if mask is None:
+            mask = _cuisine_rows(self._store.parts()[0], cuisine)
+            masks[cuisine] = mask
         return mask
 
-    def _apply_filters(self, mask, parsed):
-        # Diet (no default)
-        mask = self._filter_by_diet(mask, (parsed.get("diet") or "").lower() or None)
+    @staticmethod
+    def _full_mask(main, delta, delta_mask):
+        """Catalog-wide mask: `main` followed by delta_mask(delta) for the added rows."""
+        return main if delta is None else np.concatenate([main, delta_mask(delta)])
+
+    def _rows_containing(self, term):
+        """Rows whose ingredients contain `term` as a substring (like `term in x`)."""
+        term = str(term).lower()
+        cache = self._term_rows
+        rows = cache.get(term)
+        if rows is not None:
+            return rows
+        if term and _ING_WORD_RE.fullmatch(term):
+            hits = [p for w, p in self._ing_postings.items() if term in w]
+            delta = self._delta
+            if delta is not None:
+                hits += [p for w, p in delta.postings.items() if term in w]
+            rows = np.unique(np.concatenate(hits)) if hits else _EMPTY
+        else:
+            # punctuation/spaces can span words; fall back to a scan
+            hit = [term in x.lower() for x in self._store.ingredients]
+            rows = np.flatnonzero(np.array(hit, dtype=bool)).astype(np.int64)
+        if len(cache) >= 4096:
+            cache.clear()
+        cache[term] = rows
+        return rows
+
+    def _similarity(self, q_vec, lo=0):
+        """Cosine similarity for the rows from `lo` on sharing a term with the query."""
+        q_vec = q_vec.tocsr()
+        main, delta = self._tfidf_csc, self._delta
+        parts = [(main, 0)] if delta is None else [(main, 0), (delta.csc, delta.start)]
+        parts = [(csc, offset) for csc, offset in parts if offset + csc.shape[0] > lo]
+        if q_vec.nnz == 0 or not parts:
+            return _EMPTY, np.empty(0)
+        all_rows, all_sims = [], []
+        for csc, offset in parts:
+            sub = csc[:, q_vec.indices]
+            weights = np.repeat(q_vec.data, np.diff(sub.indptr))
+            rows, inv = np.unique(sub.indices, return_inverse=True)
+            all_sims.append(np.bincount(inv, weights=sub.data * weights, minlength=len(rows)))
+            all_rows.append(rows.astype(np.int64) + offset)
+        rows, sims = all_rows[0], all_sims[0]
+        if len(parts) > 1:
+            rows, sims = np.concatenate(all_rows), np.concatenate(all_sims)
+        if lo > parts[0][1]:
+            keep = rows >= lo
+            rows, sims = rows[keep], sims[keep]
+        return rows, sims
+
+    # ---------- helpers ----------
+    @staticmethod
+    def _row_filters(idx, parsed, live, diet_masks, time_vals, cuisine_mask):
+        """Live/diet/time/cuisine mask of the rows `idx` of one part (main or delta)."""
+        mask = live[idx]
+
+        # Diet (no default): 'veg' | 'non-veg' | 'vegan', exact category
+        dm = diet_masks.get((parsed.get("diet") or "").lower())
+        if dm is not None:
+            mask &= dm[idx]
 
         # Time (<= limit)
         tl = parsed.get("time_limit")
         if tl:
-            mask &= (pd.to_numeric(self.df["time"], errors="coerce") <= tl)
-
-        # Exclusions
-        excludes = set(parsed.get("exclude") or [])
-        if excludes:
-            ing_col = self.df["ingredients"].fillna("").str.lower()
-            mask &= ~ing_col.apply(lambda x: any(e in x for e in excludes))
+            mask &= (time_vals[idx] <= tl)
 
         # Cuisine (only if specified)
         cuisine = (parsed.get("cuisine") or "").lower()
         if cuisine:
-            mask &= self.df["cuisine"].fillna("").str.lower().str.contains(rf"\b{cuisine}\b")
+            mask &= cuisine_mask(cuisine)[idx]
+        return mask
 
+    def _apply_filters(self, rows, parsed):
+        """Boolean mask over candidate `rows` for the parsed filters."""
+        if len(rows) == 0:
+            return np.zeros(0, dtype=bool)
+        main = (self._live, self._diet_masks, self._time_vals, self._cuisine_mask)
+        delta = self._delta
+        if delta is None or rows.max() < delta.start:
+            mask = self._row_filters(rows, parsed, *main)
+        else:
+            low = rows < delta.start
+            mask = np.empty(len(rows), dtype=bool)
+            mask[low] = self._row_filters(rows[low], parsed, *main)
+            mask[~low] = self._row_filters(rows[~low] - delta.start, parsed,
+                                           delta.live, delta.diet_masks, delta.time, delta.cuisine_mask)
+
+        # Exclusions (posting lists of the excluded terms)
+        excludes = set(parsed.get("exclude") or [])
+        if excludes:
+            banned = np.concatenate([self._rows_containing(e) for e in excludes])
+            mask &= ~np.isin(rows, banned)
         return mask
 
-    # ---------- public API ----------
-    def search(self, parsed, top_k=5):
+    @staticmethod
+    def _query_text(parsed):
         parts = []
         parts += parsed.get("ingredients") or []
         if parsed.get("diet"):    parts.append(parsed["diet"])
         if parsed.get("cuisine"): parts.append(parsed["cuisine"])
-        q = " ".join(parts) if parts else "easy quick dinner"
+        return (" ".join(parts) if parts else "easy quick dinner").lower()
 
-        q_vec = self.vectorizer.transform([q.lower()])
-        sim = cosine_similarity(q_vec, self.tfidf).ravel()
+    def _candidates(self, parsed, q_vec, lo=0):
+        """(rows, sim, overlap counts) of the candidates that pass the filters,
+        plus the largest overlap count over all rows (before filtering).
+        Only rows from `lo` on are considered (shards: rows added since)."""
+        # Candidates: rows sharing a TF-IDF term with the query ...
+        with stage_latency.time("search.similarity"):
+            sim_rows, sim_vals = self._similarity(q_vec, lo)
 
-        # Soft ingredient-overlap boost
+        # ... plus rows hit by the soft ingredient-overlap boost
         inc = set(parsed.get("ingredients") or [])
-        if inc:
-            ing_col = self.df["ingredients"].fillna("").str.lower()
-            boost = ing_col.apply(lambda x: sum(1 for t in inc if t in x)).astype(float).values
-            if boost.max() > 0:
-                boost /= boost.max()
-                sim = 0.85 * sim + 0.15 * boost
+        hits = [self._rows_containing(t) for t in inc]
+        if lo:
+            hits = [rows[np.searchsorted(rows, lo):] for rows in hits]
+        boost_rows, boost_counts = _EMPTY, _EMPTY
+        if hits:
+            boost_rows, boost_counts = np.unique(np.concatenate(hits), return_counts=True)
+
+        rows = np.union1d(sim_rows, boost_rows)
+        sim = np.zeros(len(rows))
+        sim[np.searchsorted(rows, sim_rows)] = sim_vals
+        counts = np.zeros(len(rows), dtype=np.int64)
+        counts[np.searchsorted(rows, boost_rows)] = boost_counts
+        max_count = int(boost_counts.max()) if len(boost_rows) else 0
+
+        # Apply filters to the candidates only
+        with stage_latency.time("search.filters"):
+            keep = self._apply_filters(rows, parsed)
+        return rows[keep], sim[keep], counts[keep], max_count
+
+    def _score(self, parsed, q_vec):
+        """(rows, score) of the candidates that pass the filters, score > 0."""
+        rows, sim, counts, max_count = self._candidates(parsed, q_vec)
+        score = _blend(sim, counts, max_count)
+        keep = score > 0
+        return rows[keep], score[keep]
 
-        # Apply filters
-        mask = pd.Series(True, index=self.df.index)
-        mask = self._apply_filters(mask, parsed)
-        masked = np.where(mask.values, sim, -1.0)
+    def _top_k_many(self, batch, top_k):
+        """Row ids of the top_k results for every parsed query in `batch`."""
+        Q = self.vectorizer.transform([self._query_text(p) for p in batch])
+        # the transposed CSC copies are row-major term x row matrices, so the
+        # products stay CSR without converting the catalog matrix per batch
+        main, delta = self._tfidf_csc, self._delta
+        sim = Q @ main.T
+        if delta is not None:
+            sim = sparse.hstack([sim, Q @ delta.csc.T], format="csr")
+        nq, n = sim.shape
 
-        idx = np.argsort(masked)[::-1][:top_k]
-        idx = [i for i in idx if masked[i] > 0]
+        def rows_containing(term):
+            # posting lists may already hold rows added after `n` was read
+            rows = self._rows_containing(term)
+            return rows[:np.searchsorted(rows, n)]
 
+        # Overlap boost, normalized per query by its own max
+        bq, brow, bval = [], [], []
+        for qi, parsed in enumerate(batch):
+            hits = [rows_containing(t) for t in set(parsed.get("ingredients") or [])]
+            if hits:
+                rows, counts = np.unique(np.concatenate(hits), return_counts=True)
+                if len(rows):
+                    bq.append(np.full(len(rows), qi)); brow.append(rows); bval.append(counts / counts.max())
+        if bq:
+            bq, brow, bval = np.concatenate(bq), np.concatenate(brow), np.concatenate(bval)
+            has_boost = np.zeros(nq, dtype=bool)
+            has_boost[bq] = True
+            boost = sparse.csr_matrix((bval, (bq, brow)), shape=(nq, n))
+            score = (sparse.diags(np.where(has_boost, 0.85, 1.0)) @ sim + 0.15 * boost).tocsr()
+        else:
+            score = sim
+
+        # Filters and top-k one query row at a time (its indptr slice)
         out = []
-        for i in idx:
-            row = self.df.iloc[i]
-            out.append({
-                "title": row["title"],
-                "time": int(row["time"]) if str(row["time"]).isdigit() else None,
-                "cuisine": row["cuisine"],
-                "diet": row["diet"]
-            })
-
-        # Rationale
+        for qi, parsed in enumerate(batch):
+            lo, hi = score.indptr[qi], score.indptr[qi + 1]
+            rows, val = score.indices[lo:hi].astype(np.int64), score.data[lo:hi]
+            keep = val > 0
+            rows, val = rows[keep], val[keep]
+            keep = self._apply_filters(rows, parsed)
+            out.append(_top_k(rows[keep], val[keep], top_k))
+        return out
+
+    def _results(self, idx):
+        store = self._store
+        return [{
+            "title": store.title[i],
+            "time": store.time_of(i),
+            "cuisine": store.cuisine[i],
+            "diet": store.diet[i]
+        } for i in idx]
+
+    @staticmethod
+    def _rationale(parsed):
         rp = []
         if parsed.get("ingredients"): rp.append(", ".join(parsed["ingredients"]))
         if parsed.get("diet"):        rp.append(parsed["diet"])
         if parsed.get("time_limit"):  rp.append(f"≤ {parsed['time_limit']} min")
         if parsed.get("cuisine"):     rp.append(parsed["cuisine"])
-        return out, ", ".join(rp)
+        return ", ".join(rp)
+
+    # ---------- public API ----------
+    def search(self, parsed, top_k=5, mode=None):
+        """(results, rationale) of the top_k recipes for `parsed`.
+
+        mode: "lexical" (TF-IDF, the default), "semantic" (nearest LSA
+        vectors) or "hybrid" (both scores blended); the latter two need
+        build_semantic() and fall back to lexical without it.
+        """
+        with stage_latency.time("search.vectorize"):
+            q_vec = self.vectorizer.transform([self._query_text(parsed)])
+        idx = None
+        if mode in ("semantic", "hybrid"):
+            idx = self._semantic_top_k(parsed, q_vec, top_k, hybrid=mode == "hybrid")
+        elif mode not in (None, "lexical"):
+            raise ValueError(f"unknown search mode {mode!r}")
+        shards = self._shards
+        if idx is None and shards is not None:
+            with stage_latency.time("search.shards"):
+                idx = shards.top_k(self, parsed, q_vec, top_k)   # None if the pool failed
+        if idx is None:
+            rows, score = self._score(parsed, q_vec)
+            with stage_latency.time("search.top_k"):
+                idx = _top_k(rows, score, top_k)
+        return self._results(idx), self._rationale(parsed)
+
+    def _semantic_top_k(self, parsed, q_vec, top_k, hybrid):
+        """Row ids for mode="semantic"/"hybrid", or None to fall back to lexical."""
+        sem = self._semantic
+        if sem is None:
+            if not self._warned_semantic:
+                log.warning("No semantic index built; %s search falls back to lexical",
+                            "hybrid" if hybrid else "semantic")
+                RecipeRecommender._warned_semantic = True
+            return None
+        q = sem.project(q_vec)
+        if q is None:   # no known term in the query
+            return None
+        with stage_latency.time("search.semantic"):
+            rows, score = sem.search(q, lambda r: self._apply_filters(r, parsed), top_k)
+        if hybrid:
+            lex_rows, lex = self._score(parsed, q_vec)
+            with stage_latency.time("search.semantic"):
+                # the best lexical rows join the IVF candidates (both already
+                # filtered); every candidate then gets both scores
+                m = _HYBRID_CANDIDATES * top_k
+                if len(lex) > m:
+                    best = np.argpartition(-lex, m - 1)[:m]
+                    lex_rows, lex = lex_rows[best], lex[best]
+                rows = np.union1d(rows, lex_rows)
+                lex_all = np.zeros(len(rows))
+                lex_all[np.searchsorted(rows, lex_rows)] = lex
+                score = _SEMANTIC_WEIGHT * sem.similarity(rows, q) + (1 - _SEMANTIC_WEIGHT) * lex_all
+        keep = score > 0
+        with stage_latency.time("search.top_k"):
+            return _top_k(rows[keep], score[keep], top_k)
+
+    def search_many(self, parsed_list, top_k=5, batch_size=1024):
+        """search() for many queries at once; returns a list of (results, rationale).
+
+        Each batch is vectorized into one sparse matrix and scored against
+        the catalog with a single sparse-sparse product; each query's row of
+        the product is then filtered and partially sorted on its own.
+        Batches shrink on large catalogs so the product stays bounded.
+        """
+        # the score matrix holds up to batch x catalog pairs; bound it
+        batch_size = max(1, min(batch_size, _MANY_PAIRS // max(1, len(self._store))))
+        out = []
+        for start in range(0, len(parsed_list), batch_size):
+            batch = parsed_list[start:start + batch_size]
+            for parsed, idx in zip(batch, self._top_k_many(batch, top_k)):
+                out.append((self._results(idx), self._rationale(parsed)))
+        return out
+
+    def warm(self):
+        """Build what is otherwise built on first use (the title matcher) and run
+        one search, so the first requests on a new index do not pay for them."""
+        self._ensure_title_matcher()
+        self.search({"ingredients": ["tomato"], "exclude": []})
+
+    def _ensure_title_matcher(self):
+        if self._title_matcher is None:
+            with self._write_lock:   # add_recipes extends the matcher once it exists
+                if self._title_matcher is None:
+                    titles = self._store.title
+                    live = self._all_live()[:len(titles)]
+                    self._title_matcher = TitleMatcher([t if ok else "" for t, ok in zip(titles, live)])
+        return self._title_matcher
+
+    def match_title(self, name, cutoff=0.85):
+        """Result card of the catalog dish closest to `name` (typos allowed), or None."""
+        idx = self._ensure_title_matcher().match(name, cutoff=cutoff)
+        return self._results(idx)[0] if idx else None
 
     def details(self, title):
-        row = self.df[self.df["title"].str.lower() == str(title).lower()].head(1)
-        if row.empty:
+        index = self._title_index
+        if index is None:
+            with self._write_lock:
+                index = self._titles()
+        i = index.get(str(title).lower())
+        if i is None:
             return {"ingredients": "N/A", "steps": "N/A"}
-        r = row.iloc[0]
-        return {"ingredients": r["ingredients"], "steps": r["steps"]}
+        store = self._store
+        return {"ingredients": store.ingredients[i], "steps": store.steps[i]}
+
+
+if __name__ == "__main__":
+    # python recommender.py [data/recipes.csv] [index_dir]
+    data_path = sys.argv[1] if len(sys.argv) > 1 else "data/recipes.csv"
+    index_path = sys.argv[2] if len(sys.argv) > 2 else default_index_path(data_path)
+    r = RecipeRecommender(data_path, index_path=index_path, use_snapshot=False)
+    r.save_snapshot()
+    print(f"Wrote {len(r._store)} recipes to {index_path}")
@@ -0,0 +1,296 @@
+# reloader.py — hot swap of the recipe index when the catalog changes on disk
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+
+# recommender (pandas, scikit-learn) is imported where an index is built,
+# so importing this module - and the app - stays cheap
+
+log = logging.getLogger(__name__)
+
+
+class CatalogNotReady(Exception):
+    """The first index is still being built (warm="background")."""
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _digest(path, size):
+    """sha1 of the first `size` bytes of `path`"""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        left = size
+        while left > 0:
+            chunk = f.read(min(left, 1 << 20))
+            if not chunk:
+                break
+            h.update(chunk)
+            left -= len(chunk)
+    return h.hexdigest()
+
+
+class CatalogReloader:
+    """Owns the live RecipeRecommender and replaces it when the catalog changes.
+
+    A background thread polls the CSV and the snapshot's meta.json every
+    `interval` seconds. A change is acted on once it has been seen unchanged
+    on two consecutive polls, so a file still being written is not loaded.
+    If the CSV only grew (old bytes are an exact prefix of the new file) the
+    new rows are appended to a copy of the current index; otherwise a new
+    index is opened from the snapshot or fitted from the CSV. Either way the
+    new index is built (and warmed, see RecipeRecommender.warm) on the
+    polling thread and published with a single attribute assignment:
+    requests that already hold `current` finish on the old index.
+
+    add_recipes/remove_recipes update the live index in place. Appends and
+    API updates reuse the fitted vocabulary and idf; once the rows added or
+    removed since the last fit exceed `refit_ratio` of the fitted ones, the
+    polling thread compacts: it refits the live rows in the background,
+    replays updates that arrived meanwhile, and swaps the result in.
+    Updates made through the API live in memory only; a rewritten catalog
+    file replaces them. If the outgoing index has semantic vectors
+    (RecipeRecommender.build_semantic), appends extend them and reloads and
+    compactions rebuild them, so MIKA_RETRIEVAL keeps its mode. `on_change(rec)` runs after every swap or update
+    (cache resets) and once the first index is in place.
+
+    With warm="background" the constructor returns at once and the first
+    index is built (and warmed with a search) on a thread; until it is
+    ready, get() raises CatalogNotReady and `ready` is False.
+    """
+
+    def __init__(self, data_path="data/recipes.csv", index_path=None, interval=10.0,
+                 on_change=None, refit_ratio=0.2, warm="eager"):
+        if warm not in ("eager", "background"):
+            raise ValueError(f"unknown warm-up mode: {warm}")
+        self.data_path = data_path
+        # same as recommender.default_index_path, which this module does not import
+        self.index_path = index_path or os.path.splitext(data_path)[0] + ".index"
+        self.interval = interval
+        self.on_change = on_change
+        self.refit_ratio = refit_ratio
+        self.version = 0
+        self.current = None
+        self.error = None   # last failed warm-up, as text
+        self._thread = None
+        self._pid = None
+        self._warm_pid = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._seen = None
+        self._loaded_stamp = None
+        self._replay = None   # updates to re-apply after a running compaction
+        if warm == "eager":
+            self._warm_up()
+        else:
+            self.warm()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the first index is ready; False on timeout."""
+        return self._ready.wait(timeout)
+
+    def warm(self):
+        """Build the first index on a background thread (once per process)."""
+        with self._lock:
+            if self.ready or self._warm_pid == os.getpid():
+                return
+            self._warm_pid = os.getpid()
+        threading.Thread(target=self._warm_loop, name="catalog-warmup", daemon=True).start()
+
+    def get(self):
+        """The live index; also makes sure this process is polling (or warming)."""
+        if not self.ready:
+            self.warm()   # a worker forked mid-warm-up has no warm-up thread
+            raise CatalogNotReady()
+        if self.interval and (self._thread is None or self._pid != os.getpid()):
+            self.start()
+        return self.current
+
+    def start(self):
+        # threads do not survive gunicorn's fork; start one per process
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="catalog-reloader", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def check(self):
+        """Reload if the catalog changed and has settled. Returns True on swap."""
+        stamp = self._stamp()
+        if stamp == self._loaded_stamp:
+            self._seen = None
+            return False
+        if stamp != self._seen:
+            self._seen = stamp
+            return False
+        return self.reload()
+
+    def reload(self):
+        """Rebuild from what is on disk now and swap it in."""
+        with self._lock:
+            stamp = self._stamp()
+            if stamp[0] is None:
+                log.warning("Catalog %s disappeared; keeping the loaded index", self.data_path)
+                return False
+            try:
+                same_snapshot = self._loaded_stamp is not None and stamp[1] == self._loaded_stamp[1]
+                new = self._appended(stamp[0][0]) if same_snapshot else None
+                if new is None:
+                    from recommender import RecipeRecommender
+                    digest = _digest(self.data_path, stamp[0][0])
+                    new = RecipeRecommender(data_path=self.data_path, index_path=self.index_path)
+                else:
+                    new, digest = new
+                old = self.current
+                if new._semantic is None and old is not None and old._semantic is not None:
+                    # a refit (or a snapshot saved without vectors) keeps semantic search
+                    new.build_semantic(dims=old._semantic.dims)
+                new.warm()
+            except Exception:
+                log.exception("Catalog reload from %s failed; keeping the loaded index", self.data_path)
+                self._seen = None
+                return False
+            self._load(new, stamp, digest)
+            self.version += 1
+        log.info("Catalog reloaded: %d recipes (version %d)", len(new._store), self.version)
+        self._changed(new)
+        return True
+
+    def add_recipes(self, rows, replace=True):
+        """RecipeRecommender.add_recipes on the live index."""
+        if not self.ready:
+            raise CatalogNotReady()
+        with self._lock:
+            added = self.current.add_recipes(rows, replace=replace)
+            if self._replay is not None:
+                self._replay.append(("add", rows, replace))
+        self._changed(self.current)
+        return added
+
+    def remove_recipes(self, titles):
+        """RecipeRecommender.remove_recipes on the live index."""
+        titles = list(titles)
+        if not self.ready:
+            raise CatalogNotReady()
+        with self._lock:
+            removed = self.current.remove_recipes(titles)
+            if self._replay is not None:
+                self._replay.append(("remove", titles, None))
+        self._changed(self.current)
+        return removed
+
+    def compact(self):
+        """Refit the live rows off the request path (drops tombstones, refreshes idf) and swap."""
+        with self._lock:
+            old = self.current
+            self._replay = []
+        try:
+            new = old.compacted()
+            new.warm()
+        except Exception:
+            log.exception("Catalog compaction failed; keeping the loaded index")
+            with self._lock:
+                self._replay = None
+            return False
+        with self._lock:
+            replay, self._replay = self._replay, None
+            if self.current is not old:
+                return False   # a reload won the race; its index is newer
+            for op, arg, replace in replay:
+                if op == "add":
+                    new.add_recipes(arg, replace=replace)
+                else:
+                    new.remove_recipes(arg)
+            self.current = new
+            self.version += 1
+        log.info("Catalog compacted: %d recipes (version %d)", len(new._store), self.version)
+        self._changed(new)
+        return True
+
+    # ---------- internals ----------
+    def _warm_up(self):
+        """Build the first index and warm it (title matcher, one search for imports and page-in)."""
+        from recommender import RecipeRecommender
+        stamp = self._stamp()
+        digest = _digest(self.data_path, stamp[0][0]) if stamp[0] else None
+        rec = RecipeRecommender(data_path=self.data_path, index_path=self.index_path)
+        rec.warm()
+        with self._lock:
+            if self.current is None:   # a reload() may have got there first
+                self._load(rec, stamp, digest)
+        self._changed(self.current)
+
+    def _warm_loop(self):
+        t0 = time.perf_counter()
+        while not self.ready and not self._stop.is_set():
+            try:
+                self._warm_up()
+                self.error = None
+                log.info("Catalog ready after %.1fs: %d recipes",
+                         time.perf_counter() - t0, len(self.current._store))
+            except Exception as e:
+                self.error = f"{type(e).__name__}: {e}"
+                log.exception("Catalog warm-up from %s failed; retrying", self.data_path)
+                self._stop.wait(min(self.interval or 10.0, 30.0))
+
+    def _changed(self, rec):
+        if self.on_change is not None:
+            self.on_change(rec)
+
+    def _stamp(self):
+        return _stat(self.data_path), _stat(os.path.join(self.index_path, "meta.json"))
+
+    def _load(self, rec, stamp, digest):
+        """Record what `rec` was built from (stamp/digest taken before the build), then publish it."""
+        self._loaded_stamp = stamp
+        self._loaded_size = stamp[0][0] if stamp[0] else 0
+        self._loaded_digest = digest
+        self._seen = None
+        self.current = rec
+        self._ready.set()
+
+    def _appended(self, new_size):
+        """(index with the rows appended to the CSV, digest of the CSV read), or
+        None if the CSV changed in any other way."""
+        old = self.current
+        size = self._loaded_size
+        if not size or new_size <= size:
+            return None
+        if old.drift() > self.refit_ratio:
+            return None
+        with open(self.data_path, "rb") as f:
+            head = f.read(size)
+            tail = f.read(new_size - size)
+        if not head.endswith(b"\n") or hashlib.sha1(head).hexdigest() != self._loaded_digest:
+            return None
+        import pandas as pd
+        header = head.split(b"\n", 1)[0] + b"\n"
+        rows = pd.read_csv(io.BytesIO(header + tail))
+        if rows.empty:
+            return None
+        return old.appended(rows), hashlib.sha1(head + tail).hexdigest()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not self.check() and self.current.drift() > self.refit_ratio:
+                    self.compact()
+            except Exception:
+                log.exception("Catalog check failed")
@@ -0,0 +1,171 @@
+# semantic.py — dense LSA vectors and an IVF index for semantic retrieval
+#
+#   python semantic.py [data/recipes.csv] [index_dir] [dims]
+#
+# builds the vectors offline and writes them into the catalog snapshot;
+# RecipeRecommender.search(parsed, mode="semantic" | "hybrid") then uses them.
+import sys
+
+import numpy as np
+from scipy import sparse
+
+_CHUNK = 65536   # rows per matrix product when assigning rows to lists
+
+
+def _normalize(X):
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    return X / np.where(norms > 0, norms, 1)
+
+
+def _assign(X, centroids):
+    """Nearest centroid (largest dot product) of every row of X."""
+    out = np.empty(len(X), dtype=np.int32)
+    for lo in range(0, len(X), _CHUNK):
+        out[lo:lo + _CHUNK] = np.argmax(X[lo:lo + _CHUNK] @ centroids.T, axis=1)
+    return out
+
+
+def _spherical_kmeans(X, k, iters=8, seed=0):
+    """k unit-length centroids of the (unit-length) rows of X, fitted on a sample."""
+    rng = np.random.default_rng(seed)
+    sample = X[rng.choice(len(X), min(len(X), max(16 * k, 4096), 100_000), replace=False)]
+    centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+    for _ in range(iters):
+        labels = _assign(sample, centroids)
+        members = sparse.csr_matrix((np.ones(len(sample), dtype=np.float32), (labels, np.arange(len(sample)))),
+                                    shape=(k, len(sample)))
+        sums = np.asarray(members @ sample)
+        empty = np.flatnonzero(np.bincount(labels, minlength=k) == 0)
+        sums[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+        centroids = _normalize(sums).astype(np.float32)
+    return centroids
+
+
+def _lists(assign, nlist, start=0):
+    """CSR of row ids by list: rows of list l are rows[offsets[l]:offsets[l+1]]."""
+    order = np.argsort(assign, kind="stable")
+    offsets = np.zeros(nlist + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assign, minlength=nlist), out=offsets[1:])
+    return offsets, (order + start).astype(np.int64)
+
+
+class SemanticIndex:
+    """LSA row vectors of the TF-IDF matrix behind an inverted-file (IVF) index.
+
+    Rows are projected onto `dims` TruncatedSVD components, normalized, and
+    grouped into lists of about `list_size` rows around spherical k-means
+    centroids. A query scores the centroids, then only the rows of the
+    `nprobe` closest lists, so its cost depends on the list size rather
+    than the catalog size. Rows added after the build are projected with
+    the same components and kept in a small delta grouped by the same lists.
+    Vectors are stored as float16 (they are only compared, never summed).
+    """
+
+    def __init__(self, projection, centroids, vectors, offsets, rows,
+                 delta_vectors=None, delta_assign=None, nprobe=32):
+        self.projection = projection    # terms x dims: tf-idf row -> dense vector
+        self.centroids = centroids      # nlist x dims, unit length
+        self.vectors = vectors          # main rows x dims, float16, by row id
+        self.offsets, self.rows = offsets, rows
+        self.nprobe = nprobe
+        dims = projection.shape[1]
+        self.delta_vectors = np.empty((0, dims), np.float16) if delta_vectors is None else delta_vectors
+        self.delta_assign = np.empty(0, np.int32) if delta_assign is None else delta_assign
+        self.delta_offsets, self.delta_rows = _lists(self.delta_assign, len(centroids), start=len(vectors))
+
+    @classmethod
+    def build(cls, tfidf, dims=64, list_size=256, seed=0):
+        from sklearn.decomposition import TruncatedSVD
+        n, n_terms = tfidf.shape
+        dims = max(1, min(dims, n - 1, n_terms - 1))
+        svd = TruncatedSVD(n_components=dims, algorithm="randomized", random_state=seed)
+        X = _normalize(svd.fit_transform(tfidf)).astype(np.float32)
+        nlist = max(1, min(n // list_size, 65536))
+        centroids = _spherical_kmeans(X, nlist, seed=seed) if nlist > 1 else _normalize(X.sum(0, keepdims=True))
+        offsets, rows = _lists(_assign(X, centroids), nlist)
+        return cls(np.ascontiguousarray(svd.components_.T, dtype=np.float32), centroids.astype(np.float32),
+                   X.astype(np.float16), offsets, rows)
+
+    def __len__(self):
+        return len(self.vectors) + len(self.delta_vectors)
+
+    @property
+    def dims(self):
+        return self.projection.shape[1]
+
+    def project(self, q_vec):
+        """Unit vector of a 1 x terms tf-idf row, or None if it has no known term."""
+        q_vec = q_vec.tocsr()
+        if q_vec.nnz == 0:
+            return None
+        q = q_vec.data.astype(np.float32) @ self.projection[q_vec.indices]
+        norm = np.linalg.norm(q)
+        return q / norm if norm > 0 else None
+
+    def similarity(self, rows, q):
+        """Cosine of `q` with the given rows."""
+        rows = np.asarray(rows, dtype=np.int64)
+        main = len(self.vectors)
+        out = np.empty(len(rows), dtype=np.float32)
+        low = rows < main
+        out[low] = self.vectors[rows[low]].astype(np.float32) @ q
+        out[~low] = self.delta_vectors[rows[~low] - main].astype(np.float32) @ q
+        return out
+
+    def search(self, q, allowed, k):
+        """(rows, cosine) of the rows in the lists closest to `q` that pass
+        allowed(rows) -> mask. Probes `nprobe` lists at a time until at
+        least k rows passed, so selective filters widen the search."""
+        order = np.argsort(-(self.centroids @ q))
+        found_rows, found_sims, found = [], [], 0
+        for lo in range(0, len(order), self.nprobe):
+            probe = order[lo:lo + self.nprobe]
+            parts = [self.rows[self.offsets[l]:self.offsets[l + 1]] for l in probe]
+            if len(self.delta_rows):
+                parts += [self.delta_rows[self.delta_offsets[l]:self.delta_offsets[l + 1]] for l in probe]
+            rows = np.concatenate(parts)
+            rows = rows[allowed(rows)]
+            found_rows.append(rows)
+            found_sims.append(self.similarity(rows, q))
+            found += len(rows)
+            if found >= k:
+                break
+        return np.concatenate(found_rows), np.concatenate(found_sims)
+
+    def extended(self, tfidf_rows):
+        """Copy with `tfidf_rows` (new rows, in row-id order) appended."""
+        X = _normalize(np.asarray(tfidf_rows @ self.projection, dtype=np.float32))
+        return SemanticIndex(self.projection, self.centroids, self.vectors, self.offsets, self.rows,
+                             np.concatenate([self.delta_vectors, X.astype(np.float16)]),
+                             np.concatenate([self.delta_assign, _assign(X, self.centroids)]), self.nprobe)
+
+    # ---------- snapshot ----------
+    def save(self, put):
+        """Write with put(name, array); delta rows are merged into the lists."""
+        vectors = np.concatenate([self.vectors, self.delta_vectors])
+        assign = np.empty(len(vectors), dtype=np.int32)
+        assign[self.rows] = np.repeat(np.arange(len(self.centroids), dtype=np.int32), np.diff(self.offsets))
+        assign[len(self.vectors):] = self.delta_assign
+        offsets, rows = _lists(assign, len(self.centroids))
+        put("sem_projection", self.projection)
+        put("sem_centroids", self.centroids)
+        put("sem_vectors", vectors)
+        put("sem_offsets", offsets)
+        put("sem_rows", rows)
+
+    @classmethod
+    def load(cls, get):
+        return cls(get("sem_projection"), get("sem_centroids"), get("sem_vectors"),
+                   get("sem_offsets"), get("sem_rows"))
+
+
+if __name__ == "__main__":
+    from recommender import RecipeRecommender, default_index_path
+    data_path = sys.argv[1] if len(sys.argv) > 1 else "data/recipes.csv"
+    index_path = sys.argv[2] if len(sys.argv) > 2 else default_index_path(data_path)
+    dims = int(sys.argv[3]) if len(sys.argv) > 3 else 64
+    r = RecipeRecommender(data_path, index_path=index_path)
+    r.build_semantic(dims=dims)
+    r.save_snapshot()
+    print(f"Wrote {len(r._semantic)} vectors ({r._semantic.dims} dims, "
+          f"{len(r._semantic.centroids)} lists) to {index_path}")
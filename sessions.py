@@ -0,0 +1,185 @@
+# sessions.py — per-chat dialogue state stores
+#
+# Both stores share one interface: load(sid) returns a private copy of the
+# chat's Session; save(sid, session) writes it back only if nobody else saved
+# that sid in between (optimistic concurrency on Session.version), raising
+# StaleSessionError otherwise so the caller can re-run the turn.
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from dialogue import IDLE
+
+
+class StaleSessionError(Exception):
+    """The session was saved by another request since it was loaded."""
+
+
+class Session:
+    """Dialogue state of one chat (sid)."""
+    __slots__ = ("state", "mem", "version", "touched")
+
+    def __init__(self, state=IDLE, mem=None, version=0):
+        self.state = state
+        self.mem = mem if mem is not None else {}
+        self.version = version
+        self.touched = time.monotonic()
+
+    def copy(self):
+        # next_turn only replaces/removes top-level keys of mem
+        return Session(self.state, dict(self.mem), self.version)
+
+
+class SessionStore:
+    """In-process store: evicts sessions idle for idle_ttl seconds and the
+    least recently used ones beyond max_entries. State is per worker."""
+
+    def __init__(self, max_entries=10000, idle_ttl=3600):
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self._data = OrderedDict()   # least recently used first
+        self._lock = threading.Lock()
+        self.evicted_idle = 0
+        self.evicted_capacity = 0
+
+    def load(self, sid):
+        """Copy of the session for `sid`; a fresh IDLE one if missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            session = self._data.get(sid)
+            if session is None:
+                return Session()
+            self._data.move_to_end(sid)
+            session.touched = now
+            return session.copy()
+
+    def save(self, sid, session):
+        with self._lock:
+            current = self._data.get(sid)
+            if (current.version if current else 0) != session.version:
+                raise StaleSessionError(sid)
+            session.version += 1
+            session.touched = time.monotonic()
+            self._data[sid] = session.copy()
+            self._data.move_to_end(sid)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evicted_capacity += 1
+
+    def drop(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+    def _evict(self, now):
+        # entries are ordered by last access, so idle ones sit at the front
+        while self._data:
+            sid, oldest = next(iter(self._data.items()))
+            if now - oldest.touched <= self.idle_ttl:
+                break
+            del self._data[sid]
+            self.evicted_idle += 1
+
+    def __contains__(self, sid):
+        return sid in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "evicted_idle": self.evicted_idle,
+                "evicted_capacity": self.evicted_capacity,
+            }
+
+
+class SQLiteSessionStore:
+    """Store shared by every worker on the host, in a SQLite database in WAL
+    mode (readers never block the writer; no extra service needed)."""
+
+    SWEEP_EVERY = 500   # saves between idle/capacity sweeps
+
+    def __init__(self, path, max_entries=100000, idle_ttl=3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self._local = threading.local()
+        self._saves = 0
+        self.evicted_idle = 0
+        self.evicted_capacity = 0
+        with self._conn() as c:
+            c.execute(
+                "CREATE TABLE IF NOT EXISTS dialogue_state ("
+                " sid TEXT PRIMARY KEY, state TEXT NOT NULL, mem TEXT NOT NULL,"
+                " version INTEGER NOT NULL, touched REAL NOT NULL)"
+            )
+            c.execute("CREATE INDEX IF NOT EXISTS ix_dialogue_state_touched ON dialogue_state (touched)")
+
+    def _conn(self):
+        # one connection per thread and per process (gunicorn forks after import)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def load(self, sid):
+        row = self._conn().execute(
+            "SELECT state, mem, version, touched FROM dialogue_state WHERE sid = ?", (sid,)
+        ).fetchone()
+        if row is None or time.time() - row[3] > self.idle_ttl:
+            return Session(version=row[2] if row else 0)
+        return Session(row[0], json.loads(row[1]), row[2])
+
+    def save(self, sid, session):
+        mem = json.dumps(session.mem, separators=(",", ":"), ensure_ascii=False)
+        now = time.time()
+        c = self._conn()
+        if session.version == 0:
+            cur = c.execute(
+                "INSERT INTO dialogue_state (sid, state, mem, version, touched) VALUES (?, ?, ?, 1, ?)"
+                " ON CONFLICT(sid) DO NOTHING", (sid, session.state, mem, now))
+        else:
+            cur = c.execute(
+                "UPDATE dialogue_state SET state = ?, mem = ?, version = version + 1, touched = ?"
+                " WHERE sid = ? AND version = ?", (session.state, mem, now, sid, session.version))
+        if cur.rowcount != 1:
+            raise StaleSessionError(sid)
+        session.version += 1
+
+        self._saves += 1
+        if self._saves % self.SWEEP_EVERY == 0:
+            self._sweep(now)
+
+    def drop(self, sid):
+        self._conn().execute("DELETE FROM dialogue_state WHERE sid = ?", (sid,))
+
+    def _sweep(self, now):
+        c = self._conn()
+        self.evicted_idle += c.execute(
+            "DELETE FROM dialogue_state WHERE touched < ?", (now - self.idle_ttl,)).rowcount
+        self.evicted_capacity += c.execute(
+            "DELETE FROM dialogue_state WHERE sid IN (SELECT sid FROM dialogue_state"
+            " ORDER BY touched DESC LIMIT -1 OFFSET ?)", (self.max_entries,)).rowcount
+
+    def __contains__(self, sid):
+        return self._conn().execute("SELECT 1 FROM dialogue_state WHERE sid = ?", (sid,)).fetchone() is not None
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM dialogue_state").fetchone()[0]
+
+    def stats(self):
+        return {
+            "size": len(self),
+            "max_entries": self.max_entries,
+            "evicted_idle": self.evicted_idle,
+            "evicted_capacity": self.evicted_capacity,
+        }
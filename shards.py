@@ -0,0 +1,270 @@
+# shards.py — optional multi-process search over memory-mapped catalog shards
+import atexit
+import hashlib
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from recommender import RecipeRecommender, _blend, _top_k
+
+log = logging.getLogger(__name__)
+
+KEEP_SETS = 2      # shard sets a pool keeps: the live one and the one before it
+KEEP_FOR = 3600    # seconds an unused shard in a shared root is kept
+TOUCH_EVERY = 60   # seconds between mtime refreshes of the shards in use
+
+
+# ---------- worker side ----------
+_open_shards = {}   # shard dir -> RecipeRecommender, per worker process
+
+
+def _ping(_):
+    return os.getpid()
+
+
+def _open_shard(paths, i):
+    rec = _open_shards.pop(paths[i], None)   # re-inserted last: least recently used go first
+    if rec is None:
+        while len(_open_shards) >= KEEP_SETS * len(paths):
+            _open_shards.pop(next(iter(_open_shards)))
+        rec = RecipeRecommender.from_snapshot(paths[i])
+    _open_shards[paths[i]] = rec
+    return rec
+
+
+def _shard_top(paths, i, offset, parsed, q_vec, top_k, dead):
+    """(largest overlap count, rows, sim, counts) of the shard's candidates
+    that can still make the global top_k, with catalog-wide row ids.
+    `dead`: catalog-wide ids of the shard's rows removed since it was written.
+
+    The boost is normalized by the catalog-wide largest overlap, which is
+    only known once every shard has answered. It is at least this shard's
+    own maximum and at most the number of query ingredients, so the shard
+    keeps its local top_k for every value in that range.
+    """
+    rec = _open_shard(paths, i)
+    rows, sim, counts, max_count = rec._candidates(parsed, q_vec)
+    if len(dead):
+        keep = ~np.isin(rows, dead - offset)
+        rows, sim, counts = rows[keep], sim[keep], counts[keep]
+    n_terms = len(set(parsed.get("ingredients") or []))
+    # without overlaps here every max > 0 scales the shard's scores alike
+    scenarios = range(max_count, n_terms + 1) if max_count else (0, 1) if n_terms else (0,)
+    keep = np.zeros(len(rows), dtype=bool)
+    for m in scenarios:
+        score = _blend(sim, counts, m)
+        pos = np.flatnonzero(score > 0)
+        keep[pos[_top_k(np.arange(len(pos)), score[pos], top_k)]] = True
+    return max_count, rows[keep] + offset, sim[keep], counts[keep]
+
+
+# ---------- parent side ----------
+def _fingerprint(rec, lo, hi, live):
+    """sha1 of what the shard of rows lo..hi holds: pools serving the same
+    catalog (one per gunicorn worker) find each other's shards by it."""
+    h = hashlib.sha1()
+
+    def put(name, arr):
+        h.update(name.encode())
+        h.update(np.ascontiguousarray(arr).tobytes())
+
+    put("idf", rec.vectorizer.idf_)
+    tfidf = rec._all_tfidf()[lo:hi]
+    put("tfidf_data", tfidf.data)
+    put("tfidf_indices", tfidf.indices)
+    put("tfidf_indptr", tfidf.indptr)
+    rec._store.slice(lo, hi).save(put)
+    put("live", live)
+    return h.hexdigest()
+
+
+class ShardSet:
+    """One catalog version written out as shards; RecipeRecommender.search calls top_k().
+
+    The shards cover rows 0..bounds[-1] as they were when written. Rows
+    added since are searched in-process and rows removed since are sent
+    to the workers with each query, so updates never detach the shards.
+    """
+
+    def __init__(self, pool, paths, bounds, live):
+        self.pool = pool
+        self.paths = paths
+        self.bounds = bounds
+        self.live = live            # tombstone mask of the shard rows as written
+        self._dead = (None, None)   # (generation, ids removed since)
+        self._touched = time.monotonic()
+
+    def top_k(self, rec, parsed, q_vec, top_k):
+        """Global row ids of the top_k results, or None if the pool is unavailable."""
+        parsed = dict(parsed)
+        dead = self._removed(rec)
+        cuts = np.searchsorted(dead, self.bounds)
+        n = int(self.bounds[-1])
+        try:
+            futures = [self.pool._executor.submit(_shard_top, self.paths, i, int(lo), parsed, q_vec, top_k,
+                                                  dead[cuts[i]:cuts[i + 1]])
+                       for i, lo in enumerate(self.bounds[:-1])]
+            parts = []
+            if len(rec._store) > n:
+                rows, sim, counts, max_count = rec._candidates(parsed, q_vec, lo=n)
+                parts.append((max_count, rows, sim, counts))
+            parts += [f.result() for f in futures]
+        except Exception:
+            log.exception("Sharded search failed; searching in-process")
+            return None
+        if time.monotonic() - self._touched > TOUCH_EVERY:
+            self._touched = time.monotonic()
+            self.pool._touch(self.paths)
+        max_count = max(p[0] for p in parts)
+        rows, sim, counts = (np.concatenate([p[k] for p in parts]) for k in (1, 2, 3))
+        score = _blend(sim, counts, max_count)
+        keep = score > 0
+        return _top_k(rows[keep], score[keep], top_k)
+
+    def _removed(self, rec):
+        """Ids of the shard rows `rec` has removed since they were written."""
+        generation, dead = self._dead
+        if generation != rec._generation:
+            generation = rec._generation
+            dead = np.flatnonzero(self.live & ~rec._all_live()[:len(self.live)])
+            self._dead = (generation, dead)
+        return dead
+
+
+class ShardPool:
+    """Worker processes that serve RecipeRecommender.search from catalog shards.
+
+    attach(rec) splits the catalog into `shards` contiguous row ranges and
+    writes each as a snapshot under `root`; the workers memory-map them, so
+    every process shares one copy through the page cache. A query fans out
+    to all shards and the per-shard candidates are merged with the same
+    scoring and tie-breaking as the in-process search, so results are
+    identical. search_many stays in-process (it is already batched).
+
+    After add_recipes/remove_recipes the shards stay attached (see
+    ShardSet). Re-attaching the same recommender rewrites only the last
+    shard, extended with the added rows, unless it has grown past twice
+    its share. Shard directories are named by a hash of their contents,
+    so pools that share a `root` (one per gunicorn worker) write each
+    shard once; shards unused for `keep_for` seconds are removed.
+
+    Workers are forked when the pool is created, so create it before the
+    app starts background threads.
+    """
+
+    def __init__(self, processes=None, shards=None, root=None, debounce=5.0, keep_for=KEEP_FOR):
+        self.processes = processes or os.cpu_count() or 1
+        self.shards = shards or self.processes
+        self.debounce = debounce
+        self.keep_for = keep_for
+        self._own_root = root is None
+        self.root = root or tempfile.mkdtemp(prefix="recipe-shards-")
+        os.makedirs(self.root, exist_ok=True)
+        self._executor = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("fork"))
+        list(self._executor.map(_ping, range(self.processes)))   # start every worker now
+        self._attacher = ThreadPoolExecutor(1, thread_name_prefix="shard-attach")
+        self._pending = None     # latest recommender handed to attach(wait=False)
+        self._scheduled = None   # its future, until the attacher picks it up
+        self._closed = threading.Event()
+        self._sets = []          # shard paths of the last KEEP_SETS attaches
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def attach(self, rec, wait=True):
+        """Write `rec` out as shards and route its search() through the pool.
+
+        With wait=False the work runs on a background thread and returns a
+        future. Updates to an attached recommender are debounced: calls in
+        the next `debounce` seconds coalesce into one attach of the latest
+        `rec`.
+        """
+        if wait:
+            return self._attach(rec)
+        with self._lock:
+            self._pending = rec
+            if self._scheduled is None:
+                self._scheduled = self._attacher.submit(self._attach_pending)
+            return self._scheduled
+
+    def close(self):
+        self._closed.set()
+        self._attacher.shutdown(wait=False)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            if self._own_root:
+                shutil.rmtree(self.root, ignore_errors=True)
+            self._sets = []
+
+    # ---------- internals ----------
+    def _attach_pending(self):
+        with self._lock:
+            rec = self._pending
+        if rec._shards is not None:
+            self._closed.wait(self.debounce)   # more updates may follow
+        with self._lock:
+            rec, self._pending, self._scheduled = self._pending, None, None
+        if self._closed.is_set():
+            return False
+        try:
+            return self._attach(rec)
+        except Exception:
+            log.exception("Attaching catalog shards failed; searching in-process")
+            return False
+
+    def _attach(self, rec):
+        with rec._write_lock:
+            n = len(rec._store)
+            live = rec._all_live()[:n].copy()
+            old = rec._shards
+        if old is not None and old.pool is self and n - old.bounds[-2] <= 2 * n / self.shards:
+            # the other shards are unchanged; removals there go out per query
+            first = len(old.bounds) - 2
+            bounds = np.append(old.bounds[:-1], n)
+            live = np.concatenate([old.live[:bounds[first]], live[bounds[first]:]])
+            paths = list(old.paths[:first])
+        else:
+            first = 0
+            bounds = np.linspace(0, n, self.shards + 1).astype(np.int64)
+            paths = []
+        for i in range(first, len(bounds) - 1):
+            lo, hi = int(bounds[i]), int(bounds[i + 1])
+            path = os.path.join(self.root, _fingerprint(rec, lo, hi, live[lo:hi]))
+            if not os.path.exists(os.path.join(path, "meta.json")):   # else another pool wrote it
+                rec._subset(lo, hi, live[lo:hi]).save_snapshot(path)
+            paths.append(path)
+        paths = tuple(paths)
+        self._touch(paths)
+        with rec._write_lock:
+            rec._shards = ShardSet(self, paths, bounds, live)
+        with self._lock:
+            self._sets = (self._sets + [paths])[-KEEP_SETS:]
+            in_use = {p for ps in self._sets for p in ps}
+        self._collect(in_use)
+        return True
+
+    def _touch(self, paths):
+        for path in paths:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+    def _collect(self, in_use):
+        """Remove shards (and stale temporaries) nobody has used for keep_for seconds."""
+        now = time.time()
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            # a private root has no other users, but a write may be in flight
+            keep_for = self.keep_for if not self._own_root or ".tmp-" in name else 0
+            try:
+                if path not in in_use and os.stat(path).st_mtime < now - keep_for:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
@@ -0,0 +1,271 @@
+# store.py — compact columnar recipe storage (pandas only at build time)
+import itertools
+import math
+
+import numpy as np
+import pandas as pd
+
+# time of a recipe without a usable time: never satisfies `time <= limit`
+NO_TIME = np.iinfo(np.int32).max
+
+
+def _pack_strings(values):
+    """list[str] -> (utf-8 byte buffer, int64 offsets of len n+1)"""
+    encoded = [str(v).encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(buf, offsets):
+    # plain ints: indexing a (memmapped) array per element creates numpy scalars
+    raw, off = buf.tobytes(), np.asarray(offsets).tolist()
+    return [raw[a:b].decode("utf-8") for a, b in zip(off, off[1:])]
+
+
+def _code_dtype(n_categories):
+    return np.uint8 if n_categories <= 0xFF else np.uint16 if n_categories <= 0xFFFF else np.int32
+
+
+def _time_value(t):
+    """Minutes as an int; fractions round up (same `<= limit` result for whole limits)."""
+    try:
+        t = float(t)
+    except (TypeError, ValueError):
+        return NO_TIME
+    return int(math.ceil(t)) if math.isfinite(t) and -NO_TIME < t < NO_TIME else NO_TIME
+
+
+class StringColumn:
+    """Strings stored end to end in one utf-8 buffer, row i at offsets[i]:offsets[i+1]."""
+
+    def __init__(self, buf, offsets):
+        self.buf = buf
+        self.offsets = offsets
+        # memoryviews index without creating numpy scalars (the hot path)
+        self._view = memoryview(buf)
+        self._offsets = memoryview(np.ascontiguousarray(offsets, dtype=np.int64))
+
+    @classmethod
+    def from_values(cls, values):
+        return cls(*_pack_strings(values))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        off = self._offsets
+        return str(self._view[off[i]:off[i + 1]], "utf-8")
+
+    def __iter__(self):
+        return iter(_unpack_strings(self.buf, self.offsets))
+
+    def slice(self, lo, hi):
+        off = self.offsets[lo:hi + 1]
+        return StringColumn(np.asarray(self.buf[off[0]:off[-1]]), off - off[0])
+
+    def extended(self, other):
+        offsets = np.concatenate([self.offsets, other.offsets[1:] + self.offsets[-1]])
+        return StringColumn(np.concatenate([self.buf, other.buf]), offsets)
+
+
+class ChainedColumn:
+    """Rows of `head` followed by the rows of `tail` (see RecipeStore.extended)."""
+
+    def __init__(self, head, tail):
+        self.head = head
+        self.tail = tail
+        self._split = len(head)
+
+    def __len__(self):
+        return self._split + len(self.tail)
+
+    def __getitem__(self, i):
+        return self.head[i] if i < self._split else self.tail[i - self._split]
+
+    def __iter__(self):
+        return itertools.chain(self.head, self.tail)
+
+    def slice(self, lo, hi):
+        n = self._split
+        if hi <= n:
+            return self.head.slice(lo, hi)
+        if lo >= n:
+            return self.tail.slice(lo - n, hi - n)
+        return ChainedColumn(self.head.slice(lo, n), self.tail.slice(0, hi - n))
+
+
+class CategoryColumn:
+    """Low-cardinality strings as small integer codes into `categories`."""
+
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = list(categories)
+
+    @classmethod
+    def from_values(cls, values):
+        index = {}
+        codes = [index.setdefault(str(v), len(index)) for v in values]
+        return cls(np.asarray(codes, dtype=_code_dtype(len(index))), index)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        return self.categories[self.codes[i]]
+
+    def __iter__(self):
+        return (self.categories[c] for c in self.codes)
+
+    def mask(self, pred):
+        """Row mask of pred(category), evaluated once per category."""
+        hit = np.array([bool(pred(c)) for c in self.categories], dtype=bool)
+        return hit[self.codes]
+
+    def slice(self, lo, hi):
+        return CategoryColumn(self.codes[lo:hi], self.categories)
+
+    def extended(self, other):
+        index = {c: i for i, c in enumerate(self.categories)}
+        remap = np.array([index.setdefault(c, len(index)) for c in other.categories], dtype=np.int64)
+        dtype = _code_dtype(len(index))
+        codes = np.concatenate([self.codes.astype(dtype, copy=False), remap[other.codes].astype(dtype)])
+        return CategoryColumn(codes, index)
+
+
+class RecipeStore:
+    """The catalog's fields, column by column, without a DataFrame.
+
+    title/ingredients/steps are offset-indexed string buffers, cuisine and
+    diet are category codes, time is an int32 array (NO_TIME when missing).
+    Every array can be a read-only memmap of a snapshot, so workers share
+    one copy through the page cache. Stores are never modified in place:
+    extended() and slice() return new ones.
+
+    extended() does not copy this store: it returns an ExtendedStore that
+    reads the new rows from a separate tail, so adding rows costs
+    O(rows added since the last merge) and the snapshot arrays stay mapped.
+    """
+
+    TEXT = ("title", "ingredients", "steps")
+    CATEGORIES = ("cuisine", "diet")
+
+    def __init__(self, title, ingredients, steps, time, cuisine, diet):
+        self.title = title
+        self.ingredients = ingredients
+        self.steps = steps
+        self.time = time
+        self.cuisine = cuisine
+        self.diet = diet
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build from a DataFrame with the CSV's columns (missing values become "")."""
+        def text(name):
+            return df[name].fillna("").astype(str).tolist()
+        return cls(
+            *(StringColumn.from_values(text(name)) for name in cls.TEXT),
+            time=np.array([_time_value(t) for t in df["time"]], dtype=np.int32),
+            cuisine=CategoryColumn.from_values(text("cuisine")),
+            diet=CategoryColumn.from_values(text("diet")),
+        )
+
+    def __len__(self):
+        return len(self.time)
+
+    def time_of(self, i):
+        t = int(self.time[i])
+        return None if t == NO_TIME or t < 0 else t
+
+    def slice(self, lo, hi):
+        return RecipeStore(*(getattr(self, name).slice(lo, hi) for name in self.TEXT),
+                           time=self.time[lo:hi],
+                           cuisine=self.cuisine.slice(lo, hi), diet=self.diet.slice(lo, hi))
+
+    def extended(self, other):
+        """This store's rows followed by `other`'s, without copying this store."""
+        return ExtendedStore(self, other)
+
+    def concatenated(self, other):
+        """Both stores' rows in one new store (copies every column)."""
+        return RecipeStore(*(getattr(self, name).extended(getattr(other, name)) for name in self.TEXT),
+                           time=np.concatenate([self.time, other.time]),
+                           cuisine=self.cuisine.extended(other.cuisine),
+                           diet=self.diet.extended(other.diet))
+
+    def parts(self):
+        """(head, tail): the store the rows were added to, and the added rows (or None)."""
+        return self, None
+
+    def to_frame(self, rows=None):
+        """DataFrame of `rows` (default all), e.g. to refit; missing times become empty."""
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows)
+        cols = {name: [getattr(self, name)[i] for i in rows] for name in self.TEXT}
+        cols["time"] = [None if t == NO_TIME else int(t) for t in self.time[rows]]
+        for name in self.CATEGORIES:
+            cols[name] = [getattr(self, name)[i] for i in rows]
+        return pd.DataFrame(cols)[["title", "ingredients", "steps", "time", "cuisine", "diet"]]
+
+    # ---------- snapshot ----------
+    def save(self, put):
+        """Write every column with put(name, array)."""
+        for name in self.TEXT:
+            col = getattr(self, name)
+            put(f"col_{name}_buf", col.buf)
+            put(f"col_{name}_off", col.offsets)
+        for name in self.CATEGORIES:
+            col = getattr(self, name)
+            buf, off = _pack_strings(col.categories)
+            put(f"col_{name}_codes", col.codes)
+            put(f"col_{name}_cats_buf", buf)
+            put(f"col_{name}_cats_off", off)
+        put("col_time", self.time)
+
+    @classmethod
+    def load(cls, get):
+        """Inverse of save(); get(name) returns the (memory-mapped) array."""
+        def category(name):
+            return CategoryColumn(get(f"col_{name}_codes"),
+                                  _unpack_strings(get(f"col_{name}_cats_buf"), get(f"col_{name}_cats_off")))
+        return cls(*(StringColumn(get(f"col_{name}_buf"), get(f"col_{name}_off")) for name in cls.TEXT),
+                   time=get("col_time"), cuisine=category("cuisine"), diet=category("diet"))
+
+
+class ExtendedStore(RecipeStore):
+    """A store followed by the rows added to it since its last merge.
+
+    Columns are ChainedColumns; `time` (needed only to save or convert)
+    is concatenated on access. Extending again copies only the tail.
+    """
+
+    def __init__(self, head, tail):
+        self.head = head
+        self.tail = tail
+        for name in self.TEXT + self.CATEGORIES:
+            setattr(self, name, ChainedColumn(getattr(head, name), getattr(tail, name)))
+
+    @property
+    def time(self):
+        return np.concatenate([self.head.time, self.tail.time])
+
+    def __len__(self):
+        return len(self.head) + len(self.tail)
+
+    def time_of(self, i):
+        n = len(self.head)
+        return self.head.time_of(i) if i < n else self.tail.time_of(i - n)
+
+    def slice(self, lo, hi):
+        return self.merged().slice(lo, hi)
+
+    def extended(self, other):
+        return ExtendedStore(self.head, self.tail.concatenated(other))
+
+    def parts(self):
+        return self.head, self.tail
+
+    def merged(self):
+        return self.head.concatenated(self.tail)
+
+    def save(self, put):
+        self.merged().save(put)